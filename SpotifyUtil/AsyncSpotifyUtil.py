@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from SpotifyUtil.base import SpotifyUtilBase
+from SpotifyUtil.file_reader import FileReader
+from SpotifyUtil.scheduler import RequestScheduler
+from SpotifyUtil.resolver import SearchResolver
+from SpotifyUtil.instrumentation import Instrumentation, instrument_public_methods
+
+
+log = logging.getLogger(__name__)
+
+# Spotify IDs in a request path, replaced so that calls to the same endpoint are recorded together.
+_PATH_ID = re.compile(r'(?<=/)[0-9A-Za-z]{22}(?=/|$)')
+
+@instrument_public_methods
+class AsyncSpotifyUtil(SpotifyUtilBase):
+    """
+    The asyncio counterpart of `SpotifyUtil`. Needs `aiohttp` to be installed.\n
+    All requests go through a single pooled `aiohttp.ClientSession` and at most `max_concurrency` of them are in flight at once.
+    Rate limiting and retries are handled by `scheduler`, the same `RequestScheduler` used by `SpotifyUtil`, and calls are recorded by `instrumentation` like there.
+    `auth_manager` replaces the `SpotifyOAuth` built from the settings, and `api_base` points the client at another API root.
+    Song names are resolved like in `SpotifyUtil`, with the searches cached on disk if `search_cache_path` is given.
+    Use it as an async context manager, or call `open()` and `close()` yourself:\n
+    ```python
+    async with AsyncSpotifyUtil() as sp:
+        await sp.add_liked_songs_to_playlist(name="Test Liked songs", limit=20)
+    ```
+    """
+    API_BASE = "https://api.spotify.com/v1/"
+
+    def __init__(self, spotify_client_id=None, spotify_client_secret=None, spotify_redirect_uri=None, use_redis=False, cache_path=None, username=None, use_cache_handler=True, memory_mode=True, redis_pass=None, host=None, port=None, max_concurrency=10, api_base=None, scheduler=None, instrumentation=None, auth_manager=None, search_cache_path=None):
+        super().__init__(client_id=spotify_client_id, client_secret=spotify_client_secret, redirect_uri=spotify_redirect_uri, redis_pass=redis_pass)
+        self.auth_manager = auth_manager or self._create_auth_manager(use_redis=use_redis, cache_path=cache_path, username=username, use_cache_handler=use_cache_handler, memory_mode=memory_mode, host=host, port=port)
+        self.max_concurrency = max_concurrency
+        self.api_base = api_base or self.API_BASE
+        self.scheduler = scheduler or RequestScheduler(max_in_flight=max_concurrency)
+        self.instrumentation = None if instrumentation is False else instrumentation or Instrumentation()
+        if self.instrumentation: self.instrumentation.add_source("scheduler", self.scheduler.get_stats)
+        self.resolver = SearchResolver(lambda query, limit: self._request("GET", "search", params={"q": query, "type": "track", "limit": limit}), cache_path=search_cache_path)
+        self.session = None
+        self.user = None
+        self.user_id = None
+        self._semaphore = None
+
+    async def open(self):
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        try:
+            # The OAuth flow is blocking, keep it off the event loop.
+            token = await loop.run_in_executor(None, self.auth_manager.get_access_token)
+        except Exception as e:
+            print("Token couldn't be generated.")
+            raise e
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            headers={"Authorization": f"Bearer {token['access_token']}"}
+        )
+        self.user = await self._request("GET", "me")
+        self.user_id = self.user['id']
+        log.debug(msg=self.user_id)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _request(self, method, path, params=None, payload=None):
+        url = path if path.startswith("http") else self.api_base + path
+        if params: params = {key: value for key, value in params.items() if value is not None}
+        if not self.instrumentation:
+            return await self.scheduler.acall(self._send, method, url, params, payload)
+        endpoint = f"{method} {_PATH_ID.sub('{id}', url[len(self.api_base):] if url.startswith(self.api_base) else url)}"
+        attempts = [0]
+        async def attempt(*args):
+            attempts[0] += 1
+            return await self._send(*args, endpoint=endpoint, retry=attempts[0] > 1)
+        return await self.scheduler.acall(attempt, method, url, params, payload)
+
+    async def _send(self, method, url, params, payload, endpoint=None, retry=False):
+        start = time.perf_counter()
+        ok = False
+        received = 0
+        try:
+            async with self._semaphore:
+                async with self.session.request(method, url, params=params, json=payload) as response:
+                    body = await response.read()
+                    received = len(body)
+                    if response.status >= 400:
+                        from spotipy.exceptions import SpotifyException
+                        raise SpotifyException(response.status, -1, f"{response.url}:\n {body.decode(errors='replace')}", headers=response.headers)
+                    ok = True
+                    if response.status == 204 or not body:
+                        return None
+                    return json.loads(body)
+        finally:
+            if endpoint is not None:
+                sent = len(json.dumps(payload)) if payload is not None else 0
+                self.instrumentation.record_api(endpoint, time.perf_counter() - start, ok, retry=retry, bytes_in=received, bytes_out=sent)
+
+    async def _collect_pages(self, path, params, limit, offset=0) -> list:
+        """
+        Fetches the first page of `path` and then every remaining page concurrently, keeping their order.
+        """
+        results = await self._request("GET", path, params={**params, "limit": limit, "offset": offset})
+        tracks = results['items']
+        offsets = range(results['offset'] + results['limit'], results['total'], results['limit'])
+        pages = await asyncio.gather(*(self._request("GET", path, params={**params, "limit": results['limit'], "offset": page_offset}) for page_offset in offsets))
+        for page in pages:
+            tracks.extend(page['items'])
+        return tracks
+
+    async def get_track_details(self, url: str):
+        song = await self._request("GET", f"tracks/{self._parse_id(url)}")
+        return self._build_track_details(song)
+
+    async def get_tracks_details(self, urls: list) -> list:
+        """
+        Returns the track details of all the given track urls/URIs/IDs, fetching them 50 at a time.\n
+        The result is in the same order as `urls`. Tracks that Spotify couldn't find are returned as None.
+        """
+        ids = [self._parse_id(url) for url in urls]
+        chunks = await asyncio.gather(*(self._request("GET", "tracks", params={"ids": ",".join(ids[idx:idx+50])}) for idx in range(0, len(ids), 50)))
+        return [self._build_track_details(song) if song else None for chunk in chunks for song in chunk['tracks']]
+
+    async def get_playlist_name_from_id(self, playlist_id):
+        playlist = await self._request("GET", f"playlists/{self._parse_id(playlist_id, type='playlist')}", params={"fields": "name"})
+        return playlist['name']
+
+    async def _get_playlist_tracks(self, playlist_id, market=None) -> list:
+        return await self._collect_pages(f"playlists/{self._parse_id(playlist_id, type='playlist')}/tracks", {"market": market}, limit=100)
+
+    async def get_liked_songs(self, limit, offset) -> list:
+        return await self._collect_pages("me/tracks", {}, limit=limit, offset=offset)
+
+    async def get_playlist_snapshot(self, playlist_id):
+        playlist = await self._request("GET", f"playlists/{self._parse_id(playlist_id, type='playlist')}", params={"fields": "snapshot_id"})
+        return playlist['snapshot_id']
+
+    async def distribute_tracks(self, iterable, avoid_unavailable):
+        songs, missing = self._split_items(iterable)
+        fetched = dict(zip(missing, await self.get_tracks_details(missing)))
+        return self._distribute(songs, fetched, avoid_unavailable)
+
+    async def get_tracks(self, url: str, type="playlist", verbose=False, avoid_unavailable=False, market=None):
+        """
+        Awaitable version of `SpotifyUtil.get_tracks`.
+        """
+        if type=="playlist":
+            items = await self._get_playlist_tracks(url, market=market)
+        else:
+            album = await self._request("GET", f"albums/{self._parse_id(url, type=type)}", params={"market": market})
+            items = album['tracks']['items']
+        track_details_list, unplayable_tracks_list, uri_list = await self.distribute_tracks(iterable=items, avoid_unavailable=avoid_unavailable)
+        if verbose:
+            return self._track_set(track_details_list, unplayable_tracks_list)
+        return uri_list
+
+    async def create_playlist(self, name, desc=None, is_public=True, is_collaborative=False):
+        payload = {"name": name, "public": is_public, "collaborative": is_collaborative, "description": desc or ""}
+        playlist = await self._request("POST", f"users/{self.user_id}/playlists", payload=payload)
+        log.debug(f"Created playlist with name: {name}")
+        return playlist['id'], playlist['external_urls']['spotify']
+
+    async def add_tracks_in_chunks(self, iterable, playlist_id):
+        # Chunks are sent one after another so the tracks keep their order in the playlist.
+        for idx in range(0, len(iterable), 100):
+            chunk = iterable[idx:idx+100]
+            await self._request("POST", f"playlists/{self._parse_id(playlist_id, type='playlist')}/tracks", payload={"uris": chunk})
+
+    async def add_songs_to_playlist(self,
+                            playlist_url: str=None,
+                            from_url=None,
+                            type="playlist",
+                            iterable=None,
+                            name="Test Playlist",
+                            allow_duplicates: bool=False,
+                            skip_unplayables: bool=False,
+                            description=None,
+                            is_public=True,
+                            is_collaborative=False
+                            ):
+        """
+        Awaitable version of `SpotifyUtil.add_songs_to_playlist`.
+        """
+        assert not ((from_url is not None) and (iterable is not None))
+        if playlist_url is None or len(playlist_url)==0:
+            playlist_id, playlist_url = await self.create_playlist(name=name, desc=description, is_public=is_public, is_collaborative=is_collaborative)
+        else: playlist_id = self.get_id(playlist_url, type="playlist")
+        if allow_duplicates:
+            if not iterable:
+                iterable = await self.get_tracks(from_url, type=type, avoid_unavailable=skip_unplayables)
+            await self.add_tracks_in_chunks(iterable, playlist_id)
+        else:
+            if not iterable:
+                iterable, already_present_tracks = await asyncio.gather(
+                    self.get_tracks(from_url, type=type, avoid_unavailable=skip_unplayables),
+                    self.get_tracks(playlist_url, avoid_unavailable=skip_unplayables)
+                )
+            else:
+                already_present_tracks = await self.get_tracks(playlist_url, avoid_unavailable=skip_unplayables)
+            non_matching_tracks = self.get_difference(already_present_tracks, iterable)
+            await self.add_tracks_in_chunks(non_matching_tracks, playlist_id)
+        log.debug("Songs added to playlist successfully")
+        return await self.get_playlist_name_from_id(playlist_id=playlist_id)
+
+    async def add_liked_songs_to_playlist(self, name="Test Liked songs", playlist_url=None, limit=20, offset=1, is_public=True, is_collaborative=False, desc=None):
+        """
+        Awaitable version of `SpotifyUtil.add_liked_songs_to_playlist`.
+        """
+        if not playlist_url or len(playlist_url)==0: playlist_url = (await self.create_playlist(name=name, desc=desc, is_public=is_public, is_collaborative=is_collaborative))[1]
+        tracks = [track['track']['uri'] for track in await self.get_liked_songs(limit=limit, offset=offset-1)]
+        name = await self.add_songs_to_playlist(name=name, playlist_url=playlist_url, iterable=tracks, is_public=is_public, is_collaborative=is_collaborative)
+        log.debug(f"Liked songs have been added to the playlist with name: {name}")
+
+    async def delete_tracks(self, playlist_url, iterable):
+        path = f"playlists/{self._parse_id(playlist_url, type='playlist')}/tracks"
+        # Removing every occurrence doesn't depend on order, so the chunks can go out together.
+        await asyncio.gather(*(self._request("DELETE", path, payload={"tracks": [{"uri": uri} for uri in iterable[idx:idx+100]]}) for idx in range(0, len(iterable), 100)))
+
+    async def clear_playlist(self, playlist_url):
+        tracks = await self.get_tracks(playlist_url)
+        await self.delete_tracks(playlist_url=playlist_url, iterable=tracks)
+
+    async def search(self, search_str):
+        """
+        Searches for a song in spotify with the given search string and returns it's ID.
+        """
+        return self._first_search_id(await self._request("GET", "search", params={"q": search_str, "type": "track", "limit": 10}))
+
+    async def resolve_track_names(self, iterable):
+        """
+        Awaitable version of `SpotifyUtil.resolve_track_names`.
+        """
+        return await self.resolver.aresolve(iterable)
+
+    async def get_track_IDs_from_names(self, iterable):
+        """
+        Awaitable version of `SpotifyUtil.get_track_IDs_from_names`.
+        """
+        report = await self.resolve_track_names(iterable)
+        for line, reason in report.failed.items():
+            log.warning(f"Couldn't find {line}: {reason}")
+        return report.ids()
+
+    async def add_songs_to_playlist_from_file(self, file_path, playlist_url=None, name="Test Playlist", allow_duplicates=False, skip_unplayables=False):
+        """
+        Awaitable version of `SpotifyUtil.add_songs_to_playlist_from_file`.
+        """
+        assert os.path.isfile(file_path)
+        songs = FileReader.read_songs(file_path=file_path)
+        report = await self.resolve_track_names(songs)
+        Track_ids = ["spotify:track:" + track for track in report.ids()]
+        name = await self.add_songs_to_playlist(playlist_url=playlist_url, iterable=Track_ids, name=name, allow_duplicates=allow_duplicates, skip_unplayables=skip_unplayables)
+        log.debug(f"Added songs from the file {file_path} to the playlist with name: {name} ({report})")
+        return report
@@ -1,107 +1,292 @@
-from spotipy import Spotify
-from spotipy.oauth2 import SpotifyOAuth, CacheFileHandler
-from spotipy.cache_handler import MemoryCacheHandler, RedisCacheHandler
-from SpotifyUtil.config import Config
+from SpotifyUtil.base import SpotifyUtilBase, TrackSetDetails
+from SpotifyUtil.cache import TrackCache, PlaylistCache
+from SpotifyUtil.scheduler import RequestScheduler, ScheduledClient
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from SpotifyUtil.file_reader import FileReader
+from SpotifyUtil.sync import plan_sync, SyncCheckpoint
+from SpotifyUtil.stream import chunked, prefetch
+from SpotifyUtil.resolver import SearchResolver
+from SpotifyUtil.playability import PlayabilityIndex
+from SpotifyUtil.mutations import MutationQueue
+from SpotifyUtil.instrumentation import Instrumentation, instrument_public_methods
 
 
 log = logging.getLogger(__name__)
 
-class TrackSetDetails:
-    def __init__(self, total_size: int, playable_size: int, detailed_list: list, unplayable_list: list):
-        self.total_size = total_size
-        self.playable_size = playable_size
-        self.detailed_list = detailed_list
-        self.unplayable_uris = unplayable_list
-
-
-class SpotifyUtil(Config):
+@instrument_public_methods
+class SpotifyUtil(SpotifyUtilBase):
     """
-    A utility that aims to create and modify spotify playlists and albums for you using a single function.
+    A utility that aims to create and modify spotify playlists and albums for you using a single function.\n
+    Set `parallel_pages` to True to fetch all the pages of a playlist or of the liked songs concurrently, using at most `max_workers` threads.\n
+    Every API call goes through `scheduler`, a `RequestScheduler` handling rate limits and retries. A default one is created if not given.\n
+    Fetched tracks are kept in `track_cache`, a `TrackCache` of their `TrackRecord`s. By default it is an in-memory cache, persisted in Redis when `use_redis` is set.\n
+    Fetched playlists are kept in `playlist_cache`, a `PlaylistCache`, and only fetched again once their `snapshot_id` changes.\n
+    Song searches are cached too, on disk if `search_cache_path` is given.\n
+    Playlist adds and removes go through `mutations`, a `MutationQueue` sending their batches concurrently where order allows.
+    With a `mutation_journal_path`, an import interrupted midway resumes when the next client using the same path runs it again,
+    skipping the tracks it already added. `flush_mutations` applies only what it left pending instead.\n
+    API calls and public method calls are recorded by `instrumentation`, an `Instrumentation` keeping in-memory stats by default.
+    See `get_stats` and `get_prometheus_stats`. Set it to False to turn recording off.\n
+    Pass `auth_manager` to authenticate with something other than a `SpotifyOAuth` built from the settings above, e.g. `SpotifyClientCredentials`,
+    or `client` to use an already built `spotipy.Spotify` (or compatible) client. Calls made with `client` still go through `scheduler`.
+    `api_base` points the created client at another API root, e.g. a local fake for benchmarks.\n
+    Set `lazy` to True to defer the auth manager, the token exchange, the `spotify` client and the `user` lookup until they are first used,
+    e.g. for short-lived scripts. Otherwise they are all set up here, and a failing login fails right away.
     """
-    def __init__(self, spotify_client_id=None, spotify_client_secret=None, spotify_redirect_uri=None, use_redis=False, cache_path=None, username=None, use_cache_handler=True, memory_mode=True, redis_pass=None, host=None, port=None):
+    def __init__(self, spotify_client_id=None, spotify_client_secret=None, spotify_redirect_uri=None, use_redis=False, cache_path=None, username=None, use_cache_handler=True, memory_mode=True, redis_pass=None, host=None, port=None, parallel_pages=False, max_workers=8, scheduler=None, track_cache=None, playlist_cache=None, search_cache_path=None, instrumentation=None, auth_manager=None, client=None, api_base=None, mutation_journal_path=None, lazy=False):
         super().__init__(client_id=spotify_client_id, client_secret=spotify_client_secret, redirect_uri=spotify_redirect_uri, redis_pass=redis_pass)
-        try:
-            if use_cache_handler:
-                if use_redis:
-                    import redis
-                    r = redis.Redis(
-                        host=host,
-                        port=port,
-                        password=self._redis_pass
-                    )
-                    self.auth_manager = SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str, cache_handler=RedisCacheHandler(r))
-                elif memory_mode:
-                    self.auth_manager = SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str, cache_handler=MemoryCacheHandler())
-                else:
-                    self.auth_manager = SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str, cache_handler=CacheFileHandler(cache_path=cache_path, username=username))
-            elif cache_path:
-                self.auth_manager = SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str, cache_path=cache_path, username=username)
-            else:
-                self.auth_manager = SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str)
-        except Exception as e:
-            print("Auth Manager couldn't be generated.")
-            raise e
+        self.parallel_pages = parallel_pages
+        self.max_workers = max_workers
+        # Only built when `auth_manager` is first read, and never if a client or an auth manager was given.
+        self._auth_options = None if auth_manager is not None or client is not None else dict(use_redis=use_redis, cache_path=cache_path, username=username, use_cache_handler=use_cache_handler, memory_mode=memory_mode, host=host, port=port)
+        self._auth_manager = auth_manager
+        self._client = client
+        self._api_base = api_base
+        self._spotify = None
+        self._user = None
+        self._connect_lock = threading.RLock()
+        if use_redis and use_cache_handler: self.redis = self._connect_redis(host=host, port=port)
+        self.track_cache = track_cache if track_cache is not None else TrackCache(redis=self.redis)
+        # Only records are cached, so the full JSON is fetched whenever it's asked for.
+        self._track_loader = lambda id: self.spotify.track(id)
+        if self.track_cache.loader is None: self.track_cache.loader = self._track_loader
+        self.playability = PlayabilityIndex()
+        self.playlist_cache = playlist_cache if playlist_cache is not None else PlaylistCache()
+        if self.playlist_cache.loader is None: self.playlist_cache.loader = self._track_loader
+        # Cached playlist ID -> its snapshot before our next batch, while one of our operations is changing it. See `_mutating`.
+        self._snapshots = {}
+        # (playlist ID, snapshot after one of our batches) -> the snapshot before it.
+        self._snapshots_before = {}
+        self._snapshot_lock = threading.Lock()
+        self.mutations = MutationQueue(self._send_add, self._send_remove, journal_path=mutation_journal_path, max_workers=max_workers, on_applied=self._mutation_applied)
+        self.resolver = SearchResolver(lambda query, limit: self.spotify.search(query, limit=limit), cache_path=search_cache_path, max_workers=max_workers)
+        self.scheduler = scheduler or RequestScheduler()
+        self.instrumentation = self._create_instrumentation(instrumentation)
+        if not lazy: self.user
+
+    @property
+    def auth_manager(self):
+        if self._auth_manager is None and self._auth_options is not None:
+            with self._connect_lock:
+                if self._auth_manager is None:
+                    self._auth_manager = self._create_auth_manager(**self._auth_options)
+        return self._auth_manager
+
+    @auth_manager.setter
+    def auth_manager(self, auth_manager):
+        self._auth_manager = auth_manager
+
+    @property
+    def spotify(self):
+        """
+        The `spotipy.Spotify` client wrapped in a `ScheduledClient`, logged in on first use.
+        """
+        if self._spotify is None:
+            with self._connect_lock:
+                if self._spotify is None:
+                    client = self._client if self._client is not None else self._create_client(self._api_base)
+                    self._spotify = ScheduledClient(client, self.scheduler, instrumentation=self.instrumentation)
+        return self._spotify
+
+    @spotify.setter
+    def spotify(self, spotify):
+        self._spotify = spotify
+
+    @property
+    def user(self):
+        if self._user is None:
+            with self._connect_lock:
+                if self._user is None:
+                    self._user = self.spotify.current_user()
+                    log.debug(msg=self._user['id'])
+        return self._user
+
+    @property
+    def user_id(self):
+        return self.user['id']
+
+    def _create_client(self, api_base=None):
+        import requests
+        from spotipy import Spotify
         try:
             token = self.auth_manager.get_access_token()
         except Exception as e:
             print("Token couldn't be generated.")
             raise e
-        self.spotify = Spotify(auth=token['access_token'])
-        self.user = self.spotify.current_user()
-        self.user_id = self.user['id']
-        log.debug(msg=self.user_id)
-
-    def get_track_details(self, url: str):
-        song = self.spotify.track(url)
-        name = song['name']
-        artist = song['album']['artists'][0]['name']
-        return {"track": song, "name": name, "artist": artist, "uri": song['uri'], "playable": self.check_track_is_playable(song)}
-
-    @staticmethod
-    def get_id(url: str, type="track"):
-        return url.split(type+"/")[1].split('?')[0]
-
-    def create_uri(self, url: str=None, id=None, type="track"):
-        if not id: id = self.get_id(url=url, type=type)
-        return f'spotify:{type}:{id}'
-    
+        # Retries are left to the scheduler, so the session must not retry on its own and swallow the Retry-After header.
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.scheduler.max_in_flight)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if self.instrumentation:
+            session.hooks['response'].append(self._count_bytes)
+        client = Spotify(auth=token['access_token'], requests_session=session)
+        if api_base: client.prefix = api_base
+        return client
+
+    def _create_instrumentation(self, instrumentation):
+        if instrumentation is False:
+            return None
+        instrumentation = instrumentation or Instrumentation()
+        instrumentation.add_source("scheduler", self.scheduler.get_stats)
+        instrumentation.add_source("track_cache", self.track_cache.get_stats)
+        instrumentation.add_source("playlist_cache", self.playlist_cache.get_stats)
+        return instrumentation
+
+    def _count_bytes(self, response, *args, **kwargs):
+        body = response.request.body
+        self.instrumentation.count_bytes(received=len(response.content), sent=len(body) if body else 0)
+
+    def _fetch_tracks(self, urls: list, refresh=False) -> list:
+        """
+        Returns the `TrackRecord` of all the given track urls/URIs/IDs, in order, using `track_cache` for the ones it has.
+        """
+        ids = [self._parse_id(url) for url in urls]
+        found = {} if refresh else self.track_cache.get_many(ids)
+        # Records read back from a persistent track cache were never indexed here.
+        self.playability.update(found.values())
+        missing = [id for id in dict.fromkeys(ids) if id not in found]
+        for idx in range(0, len(missing), 50):
+            songs = self.spotify.tracks(missing[idx:idx+50])['tracks']
+            fetched = {id: self._build_track_details(song) for id, song in zip(missing[idx:idx+50], songs) if song}
+            self.track_cache.set_many(fetched)
+            # Cached playlists would otherwise put the old markets back into `playability` the next time they are read.
+            if refresh: self.playlist_cache.update_tracks(fetched)
+            found.update(fetched)
+        return [found.get(id) for id in ids]
+
+    def get_track_details(self, url: str, refresh=False):
+        return self._fetch_tracks([url], refresh=refresh)[0]
+
+    def get_tracks_details(self, urls: list, refresh=False) -> list:
+        """
+        Returns the track details of all the given track urls/URIs/IDs. Tracks missing from `track_cache` are fetched 50 at a time.\n
+        The result is in the same order as `urls`. Tracks that Spotify couldn't find are returned as None.\n
+        Set `refresh` to True to skip the cache and fetch every track again.
+        """
+        return self._fetch_tracks(urls, refresh=refresh)
+
+    def refresh_track_markets(self, urls: list):
+        """
+        Fetches the given tracks again and updates `track_cache`, `playability` and the cached playlists holding them,
+        e.g. when their `available_markets` may have changed.
+        """
+        self._fetch_tracks(urls, refresh=True)
+
     def get_playlist_name_from_id(self, playlist_id):
         playlist = self.spotify.user_playlist(user=None, playlist_id=playlist_id, fields="name")
         return playlist['name']
     
-    def _get_playlist_tracks(self, playlist_id, market=None) -> list:
-        results = self.spotify.user_playlist_tracks(self.user_id, playlist_id, market=market)
+    def _collect_pages(self, results, fetch_page, parallel=None) -> list:
+        """
+        Returns the items of the paging response `results` followed by the items of every page after it.\n
+        Params:\n
+        - `fetch_page` -> Callable taking `limit` and `offset` that fetches a single page. Only used in parallel mode.\n
+        - `parallel` -> Fetch the remaining pages concurrently instead of following `next` one by one. Defaults to `parallel_pages`.
+        """
         tracks = results['items']
-        while results['next']:
-            results = self.spotify.next(results)
-            tracks.extend(results['items'])
+        if parallel is None: parallel = self.parallel_pages
+        if not parallel:
+            while results['next']:
+                results = self.spotify.next(results)
+                tracks.extend(results['items'])
+            return tracks
+        # The first page reports the total, so every remaining offset is known up front.
+        # executor.map hands the pages back in offset order.
+        limit = results['limit']
+        offsets = range(results['offset'] + limit, results['total'], limit)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for page in executor.map(lambda offset: fetch_page(limit=limit, offset=offset), offsets):
+                tracks.extend(page['items'])
         return tracks
+
+    def _get_playlist_tracks(self, playlist_id, market=None, parallel=None) -> list:
+        fetch_page = partial(self.spotify.user_playlist_tracks, None, playlist_id, market=market)
+        return self._collect_pages(fetch_page(), fetch_page, parallel=parallel)
     
-    def get_liked_songs(self, limit, offset) -> list:
-        results = self.spotify.current_user_saved_tracks(limit=limit, offset=offset)
-        tracks = results['items']
+    def get_liked_songs(self, limit, offset, parallel=None) -> list:
+        fetch_page = self.spotify.current_user_saved_tracks
+        return self._collect_pages(fetch_page(limit=limit, offset=offset), fetch_page, parallel=parallel)
+    
+    def _iter_pages(self, results):
+        yield results['items']
         while results['next']:
             results = self.spotify.next(results)
-            tracks.extend(results['items'])
-        return tracks
-    
+            yield results['items']
+
+    def _iter_records(self, pages, playable_only=False, dedupe=False, prefetch_pages=0):
+        """
+        Turns pages of playlist/album items into slim track records, hydrating each page on its own.
+        """
+        if prefetch_pages:
+            pages = prefetch(pages, prefetch_pages)
+        seen = set()
+        for page in pages:
+            track_details_list = self.distribute_tracks(iterable=page, avoid_unavailable=False)[0]
+            for details in track_details_list:
+                if playable_only and not details['playable']: continue
+                if dedupe:
+                    if details['uri'] in seen: continue
+                    seen.add(details['uri'])
+                yield details
+
+    def iter_tracks(self, url: str, type="playlist", market=None, playable_only=False, dedupe=False, prefetch_pages=0):
+        """
+        Yields a `TrackRecord` per track of the playlist/album, page by page, instead of building the whole list first.\n
+        Params:\n
+        - `type` -> The type of the track set. Can be "playlist" or "album". Set to "playlist" by default\n
+        - `playable_only` -> Leave out unplayable tracks.\n
+        - `dedupe` -> Leave out tracks that were already yielded.\n
+        - `prefetch_pages` -> Fetch up to this many pages in the background while the records are being consumed. Set to 0 by default.\n
+        The stream can be handed straight to a writer, which then starts adding tracks before the last page is fetched:\n
+        ```python
+        sp.add_tracks_in_chunks(sp.iter_tracks(url, playable_only=True, prefetch_pages=2), playlist_id)
+        ```
+        """
+        uri = self.create_uri(url=url, type=type)
+        if type=="playlist":
+            results = self.spotify.user_playlist_tracks(None, uri, market=market)
+        else:
+            results = self.spotify.album(uri, market=market)['tracks']
+        return self._iter_records(self._iter_pages(results), playable_only=playable_only, dedupe=dedupe, prefetch_pages=prefetch_pages)
+
+    def iter_liked_songs(self, limit=50, offset=0, playable_only=False, dedupe=False, prefetch_pages=0):
+        """
+        Same as `iter_tracks`, for the liked songs starting from `offset`, fetched `limit` at a time.
+        """
+        results = self.spotify.current_user_saved_tracks(limit=limit, offset=offset)
+        return self._iter_records(self._iter_pages(results), playable_only=playable_only, dedupe=dedupe, prefetch_pages=prefetch_pages)
+
     def get_playlist_snapshot(self, playlist_id):
-        return self.spotify.playlist(playlist_id=playlist_id)['snapshot_id']
+        return self.spotify.playlist(playlist_id=playlist_id, fields="snapshot_id")['snapshot_id']
+
+    def _get_playlist_details(self, playlist_id, market=None) -> list:
+        """
+        Returns the track details of every track in the playlist, served from `playlist_cache` while the playlist's snapshot is unchanged.
+        """
+        # The snapshot is read before the tracks, so a change in between only makes the next call refetch.
+        snapshot_id = self.get_playlist_snapshot(playlist_id)
+        track_details_list = self.playlist_cache.get(playlist_id, snapshot_id, market=market)
+        if track_details_list is None:
+            items = self._get_playlist_tracks(playlist_id, market=market)
+            track_details_list = self.distribute_tracks(iterable=items, avoid_unavailable=False)[0]
+            self.playlist_cache.set(playlist_id, snapshot_id, track_details_list, market=market)
+        else:
+            # Records read back from a persistent playlist cache were never built here.
+            self.playability.update(track_details_list)
+        return track_details_list
     
     def distribute_tracks(self, iterable, avoid_unavailable):
-        track_details_list = []
-        unplayable_tracks_list = []
-        uri_list = []
-        for track in iterable:
-            temp = self.get_track_details(track['track']['uri'])
-            track_details_list.append(temp)
-            if not temp['playable']:
-                unplayable_tracks_list.append(temp['uri'])
-                if avoid_unavailable: continue
-            uri_list.append(temp['uri'])
+        songs, missing = self._split_items(iterable)
+        fetched = dict(zip(missing, self.get_tracks_details(missing)))
+        track_details_list, unplayable_tracks_list, uri_list = self._distribute(songs, fetched, avoid_unavailable)
+        # Records of market-less payloads are what spotify.tracks() would have given, so they can be cached as they are.
+        self.track_cache.set_many({record.id: record for record in track_details_list if record.markets is not None and record.uri not in fetched})
         return track_details_list, unplayable_tracks_list, uri_list
     
     def get_tracks(self, url: str, type="playlist", verbose=False, avoid_unavailable=False, market=None):
@@ -115,16 +300,13 @@ class SpotifyUtil(Config):
         uri = self.create_uri(url=url, type=type)
         items = None
         if type=="playlist":
-            items = self._get_playlist_tracks(uri, market=market)
-            track_details_list, unplayable_tracks_list, uri_list = self.distribute_tracks(iterable=items, avoid_unavailable=avoid_unavailable)
+            track_details_list = self._get_playlist_details(self.get_id(url=url, type=type), market=market)
+            track_details_list, unplayable_tracks_list, uri_list = self._split_details(track_details_list, avoid_unavailable=avoid_unavailable)
         else:
             items = self.spotify.album(uri)
             track_details_list, unplayable_tracks_list, uri_list = self.distribute_tracks(iterable=items['tracks']['items'], avoid_unavailable=avoid_unavailable)
         if verbose:
-            total_size = len(track_details_list)
-            unplayable_tracks_size = len(unplayable_tracks_list)
-            playable_size = total_size - unplayable_tracks_size
-            return TrackSetDetails(total_size=total_size, playable_size=playable_size, detailed_list=track_details_list, unplayable_list=unplayable_tracks_list)
+            return self._track_set(track_details_list, unplayable_tracks_list)
         return uri_list
     
     def create_playlist(self, name, desc=None, is_public=True, is_collaborative=False):
@@ -140,41 +322,20 @@ class SpotifyUtil(Config):
         log.debug(f"Created playlist with name: {name}")
         return playlist['id'], playlist['external_urls']['spotify']
     
-    def get_difference(self, list1, list2, mode="to_be_added"):
-        if isinstance(list1, TrackSetDetails):
-            full_list1 = list1.detailed_list
-            list1 = [track['uri'] for track in full_list1]
-            full_list2 = list2.detailed_list
-            list2 = [track['uri'] for track in full_list2]
-        set1 = set(list1)
-        set2 = set(list2)
-        if mode=="to_be_added":
-            return list(set2.difference(set1))
-        return list(set1.difference(set2))
-    
-    def get_difference_multi(self, main, *lists, mode="to_be_added"):
-        result = set()
-        if mode=="to_be_removed":
-            return list(set(main).difference([set(li) for li in lists]))
-        for li in lists:
-            result = result.union(set(li).difference(set(main)))
-        return list(result)
-    
     def get_total_songs_length(self, url):
-        results = self.spotify.user_playlist_tracks(self.user_id, url)
+        results = self.spotify.user_playlist_tracks(None, url)
         tracks = results['total']
         while results['next']:
             results = self.spotify.next(results)
             tracks+=results['total']
         return tracks
     
-    def get_playable_songs_length(self, url):
-        results = self._get_playlist_tracks(url)
-        count = 0
-        for track in results:
-            if self.check_track_is_playable(track):
-                count+=1
-        return count
+    def get_playable_songs_length(self, url, market=None):
+        """
+        Returns the no. of tracks of the playlist available in `market`, or in any market if not given.
+        """
+        tracks = self._get_playlist_details(self._parse_id(url, type="playlist"))
+        return sum(self.playability.playable([track.id for track in tracks], market=market))
         
     def get_different_tracks(self, url1, url2):
         """
@@ -184,33 +345,118 @@ class SpotifyUtil(Config):
         list2 = self.get_tracks(url2, verbose=True)
         return self.get_difference(list1, list2)
     
-    def check_track_is_playable(self, track) -> bool:
+    def check_track_is_playable(self, track, market=None) -> bool:
         """
-        Checks if the market of the track is null or not.
+        Checks if the track is available in `market`, or in any market if not given. Takes a track url/URI/ID, a track object or a `TrackRecord`.
         """
-        result = False
-        if not isinstance(track, dict):
-            track = self.spotify.track(track)
-        try:
-            result = len(track['available_markets'])>0
-        except:
-            try:
-                result = track['is_playable']==True
-            except:
-                result = len(track['track']['available_markets'])>0
-        return result
+        if isinstance(track, str):
+            playable = self.playability.is_playable(self._parse_id(track), market=market)
+            if playable is not None: return playable
+            track = self._fetch_tracks([track])[0]
+        return self._is_playable(track, market=market)
     
-    def get_unplayable_songs(self, tracks):
-        return [track['uri'] for track in tracks if not self.check_track_is_playable(track)]
+    def get_unplayable_songs(self, tracks, market=None):
+        return [self._to_uri(track) for track in tracks if not self.check_track_is_playable(track, market=market)]
     
     def get_unplayable_songs_from_playlist(self, playlist_url, market=None):
-        songs = self.get_tracks(playlist_url, verbose=True, market=market)
-        return self.get_unplayable_songs(songs.detailed_list)
+        """
+        Returns the URIs of the tracks of the playlist that aren't available in `market`, or in any market if not given.\n
+        The tracks come from the playlist cache and are checked against `playability` in one pass, without hydrating them again.
+        """
+        tracks = self._get_playlist_details(self.get_id(playlist_url, type="playlist"))
+        return [f"spotify:track:{id}" for id in self.playability.unplayable([track.id for track in tracks], market=market)]
     
+    @contextmanager
+    def _mutating(self, *playlist_ids):
+        """
+        Reads the snapshot of the given playlists that are cached, before our own batches change them.
+        Every batch is then known to follow that snapshot or the one our previous batch returned,
+        and only patches the cache if it was still at that snapshot, i.e. if someone else didn't change the playlist since it was cached.
+        """
+        for playlist_id in playlist_ids:
+            if self.playlist_cache.is_cached(playlist_id):
+                snapshot_id = self.get_playlist_snapshot(playlist_id)
+                with self._snapshot_lock:
+                    self._snapshots[playlist_id] = snapshot_id
+        try:
+            yield
+        finally:
+            with self._snapshot_lock:
+                for playlist_id in playlist_ids:
+                    self._snapshots.pop(playlist_id, None)
+
+    def _send(self, playlist_id, send):
+        with self._snapshot_lock:
+            before = self._snapshots.get(playlist_id)
+        snapshot_id = send()['snapshot_id']
+        if before is not None:
+            with self._snapshot_lock:
+                self._snapshots_before[(playlist_id, snapshot_id)] = before
+                if playlist_id in self._snapshots: self._snapshots[playlist_id] = snapshot_id
+        return snapshot_id
+
+    def _send_add(self, playlist_id, uris):
+        return self._send(playlist_id, lambda: self.spotify.user_playlist_add_tracks(user=None, playlist_id=playlist_id, tracks=uris))
+
+    def _send_remove(self, playlist_id, uris):
+        return self._send(playlist_id, lambda: self.spotify.user_playlist_remove_all_occurrences_of_tracks(None, playlist_id, uris))
+
+    def _mutation_applied(self, playlist_id, snapshot_id, added, removed):
+        """
+        Keeps a cached playlist up to date after a batch of `mutations` went through.
+        """
+        with self._snapshot_lock:
+            before = self._snapshots_before.pop((playlist_id, snapshot_id), None)
+        if not self.playlist_cache.is_cached(playlist_id):
+            return
+        if before is None:
+            # There's no telling what the cached version misses, or if it holds the batch already when it was cached meanwhile.
+            self.playlist_cache.invalidate(playlist_id)
+            return
+        if removed:
+            self.playlist_cache.apply(playlist_id, snapshot_id, removed_uris=removed, before=before)
+        if added:
+            # Only tracks the track cache still has are worth adding in place. Fetching the rest would cost more calls
+            # than reading the playlist again, which is put off until it's needed.
+            ids = [self._parse_id(uri) for uri in added]
+            found = self.track_cache.get_many(ids)
+            if len(found) < len(set(ids)):
+                self.playlist_cache.invalidate(playlist_id)
+                return
+            self.playlist_cache.apply(playlist_id, snapshot_id, added=[found[id] for id in ids], before=before)
+
+    def flush_mutations(self, playlist_url=None) -> dict:
+        """
+        Applies the queued adds and removes of the playlist, or of every playlist if not given, e.g. the ones left by an interrupted import.
+        The import then counts as done, so running it again adds its tracks anew.
+        Returns the no. of tracks added and removed per playlist ID.
+        """
+        if playlist_url is None:
+            with self._mutating(*self.mutations.pending()):
+                return self.mutations.flush()
+        playlist_id = self._parse_id(playlist_url, type="playlist")
+        with self._mutating(playlist_id):
+            return self.mutations.flush(playlist_id)
+
     def add_tracks_in_chunks(self, iterable, playlist_id):
-        for idx in range(0, len(iterable), 100):
-            chunk = iterable[idx:idx+100]
-            self.spotify.user_playlist_add_tracks(user=self.user_id, playlist_id=playlist_id, tracks=chunk)
+        """
+        Adds the tracks to the playlist 100 at a time. `iterable` can be any iterable of URIs or track records, e.g. the stream of `iter_tracks`.
+        The chunks are flushed in the background while the next ones are read, so the adds keep pace with a stream instead of waiting for its end.
+        Chunks read while a flush is running go out together with the next flush.\n
+        It runs as an import of `mutations`: with a journal, running it again after an interruption skips the tracks that were already added.
+        """
+        playlist_id = self._parse_id(playlist_id, type="playlist")
+        with self._mutating(playlist_id), self.mutations.importing(playlist_id), ThreadPoolExecutor(max_workers=1) as executor:
+            flushing = None
+            for chunk in chunked(iterable, self.mutations.batch_size):
+                self.mutations.add(playlist_id, [self._to_uri(track) for track in chunk])
+                if flushing is None or flushing.done():
+                    # Raises the error of the previous flush, which stops the import.
+                    if flushing is not None: flushing.result()
+                    flushing = executor.submit(self.mutations.flush, playlist_id)
+            if flushing is not None: flushing.result()
+            # The chunks read during the last flush, and adds resumed from the journal but never queued again, still have to go out.
+            self.mutations.flush(playlist_id)
 
     def add_songs_to_playlist(self, 
                             playlist_url: str=None, 
@@ -270,9 +516,10 @@ class SpotifyUtil(Config):
         log.debug(f"Liked songs have been added to the playlist with name: {name}")
 
     def delete_tracks(self, playlist_url, iterable):
-        for idx in range(0, len(iterable), 100):
-            chunk = iterable[idx:idx+100]
-            self.spotify.user_playlist_remove_all_occurrences_of_tracks(self.user_id, playlist_url, chunk)
+        playlist_id = self._parse_id(playlist_url, type="playlist")
+        self.mutations.remove(playlist_id, [self.create_uri(id=self._parse_id(self._to_uri(track))) for track in iterable])
+        with self._mutating(playlist_id):
+            self.mutations.flush(playlist_id)
 
     def clear_playlist(self, playlist_url):
         tracks = self.get_tracks(playlist_url)
@@ -282,20 +529,24 @@ class SpotifyUtil(Config):
         """
         Searches for a song in spotify with the given search string and returns it's ID.
         """
-        return self.spotify.search(search_str)["tracks"]["items"][0]["external_urls"]["spotify"].split("track/")[1]
+        return self._first_search_id(self.spotify.search(search_str))
+
+    def resolve_track_names(self, iterable):
+        """
+        Searches for the songs of the given "Song Name - Artist" lines concurrently and returns a `ResolveReport` of the resolved, ambiguous and failed lines.\n
+        Repeated lines are searched once, and lines searched before are served from the search cache.
+        """
+        return self.resolver.resolve(iterable)
 
     def get_track_IDs_from_names(self, iterable):
         """
         Searches for a song in spotify with the given list of search strings and returns their IDs.
+        Lines without an exact match get the best guess, lines without any result are left out.
         """
-        track_ids = []
-        for line in iterable:
-            try:
-                track_ids.append(self.search(line))
-            except Exception as e:
-                print("Error:")
-                print(e)
-        return track_ids
+        report = self.resolve_track_names(iterable)
+        for line, reason in report.failed.items():
+            log.warning(f"Couldn't find {line}: {reason}")
+        return report.ids()
     
     def add_songs_to_playlist_from_file(self, file_path, playlist_url=None, name="Test Playlist", allow_duplicates=False, skip_unplayables=False):
         """
@@ -307,13 +558,56 @@ class SpotifyUtil(Config):
         - `file_path` -> The path of the file you want to add your songs from. The content of the file has to be "Song Name - Artist" separated by newlines.\n
         - `allow_duplicates` -> A boolean to set if you want to allow duplicate songs to be added again in the playlist. Set to False by default.\n
         - `skip_unplayables` -> A boolean to set if you want to allow unplayable songs to be added again in the playlist. Set to False by default.\n
+        Returns the `ResolveReport` of the file's lines.
         """
         assert os.path.isfile(file_path)
         songs = FileReader.read_songs(file_path=file_path)
-        Track_ids = self.get_track_IDs_from_names(songs)
-        Track_ids = ["spotify:track:" + track for track in Track_ids]
+        report = self.resolve_track_names(songs)
+        Track_ids = ["spotify:track:" + track for track in report.ids()]
         name = self.add_songs_to_playlist(playlist_url=playlist_url, iterable=Track_ids, name=name, allow_duplicates=allow_duplicates, skip_unplayables=skip_unplayables)
-        log.debug(f"Added songs from the file {file_path} to the playlist with name: {name}")
+        log.debug(f"Added songs from the file {file_path} to the playlist with name: {name} ({report})")
+        return report
+
+    def sync_playlist(self, source_url, target_url, type="playlist", skip_unplayables=False, checkpoint_path=None):
+        """
+        Makes the target playlist an exact mirror of the source playlist/album, tracks and order included, with as few API calls as possible.\n
+        Only the difference is applied: tracks missing from the source are removed, the rest are moved in blocks and new tracks are inserted in place, 100 at a time.
+        When that would take more calls than rewriting the target, its tracks are replaced instead.\n
+        Params:\n
+        - `source_url` -> The url of the track set to mirror.\n
+        - `target_url` -> The url of the playlist to update.\n
+        - `type` -> The type of the source track set. Can be "playlist" or "album". Set to "playlist" by default\n
+        - `skip_unplayables` -> Leave unplayable tracks of the source out of the target. Set to False by default.\n
+        - `checkpoint_path` -> A file to keep the progress in. If a sync fails midway, calling it again with the same file resumes it,
+        as long as the target playlist wasn't changed by someone else in between. (Optional)
+        """
+        target_id = self.get_id(target_url, type="playlist")
+        checkpoint = SyncCheckpoint(checkpoint_path)
+        snapshot_id = self.get_playlist_snapshot(target_id)
+        state = checkpoint.load(source_url, target_url)
+        if state is None or state["snapshot_id"] != snapshot_id:
+            desired = self.get_tracks(source_url, type=type, avoid_unavailable=skip_unplayables)
+            current = [item['track']['uri'] if item['track'] else None for item in self._get_playlist_tracks(target_id)]
+            state = {"source": source_url, "target": target_url, "snapshot_id": snapshot_id, "done": 0, "ops": plan_sync(current, desired)}
+            checkpoint.save(state)
+        try:
+            for op in state["ops"][state["done"]:]:
+                if op["op"] == "remove":
+                    result = self.spotify.playlist_remove_specific_occurrences_of_items(target_id, op["items"], snapshot_id=state["snapshot_id"])
+                elif op["op"] == "move":
+                    result = self.spotify.playlist_reorder_items(target_id, op["range_start"], op["insert_before"], range_length=op["range_length"], snapshot_id=state["snapshot_id"])
+                elif op["op"] == "replace":
+                    result = self.spotify.playlist_replace_items(target_id, op["uris"])
+                else:
+                    result = self.spotify.playlist_add_items(target_id, op["uris"], position=op["position"])
+                state["snapshot_id"] = result['snapshot_id']
+                state["done"] += 1
+                checkpoint.save(state)
+        finally:
+            self.playlist_cache.invalidate(target_id)
+        checkpoint.clear()
+        log.debug(f"Synced {target_url} with {source_url} in {len(state['ops'])} calls")
+        return {op: sum(1 for entry in state["ops"] if entry["op"] == op) for op in ("remove", "move", "add", "replace")}
 
     def create_unplayable_track_playlist(self, name, playlist_url, description=None, is_public=True, is_collaborative=False, market=None):
         """
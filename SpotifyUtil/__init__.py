@@ -1,7 +1,27 @@
+import importlib
 from SpotifyUtil.config import Config
 from SpotifyUtil.SpotifyUtil import SpotifyUtil
 
+# Exports imported on first access, since they pull in heavier modules than `SpotifyUtil` needs.
+_LAZY_EXPORTS = {
+    "AsyncSpotifyUtil": "SpotifyUtil.AsyncSpotifyUtil",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
+
+
 __all__ = [
     "Config",
     "SpotifyUtil",
-]
\ No newline at end of file
+    "AsyncSpotifyUtil",
+]
@@ -0,0 +1,169 @@
+from SpotifyUtil.config import Config
+from SpotifyUtil.records import TrackRecord, TrackSetDetails
+from SpotifyUtil.diff import PlaylistDiff
+
+
+class SpotifyUtilBase(Config):
+    """
+    The auth, parsing and diffing logic shared by `SpotifyUtil` and `AsyncSpotifyUtil`. Nothing in here talks to the Spotify API.
+    """
+    # Called with a track ID to load the full JSON of a `TrackRecord`.
+    _track_loader = None
+    # A `PlayabilityIndex` every built record is added to.
+    playability = None
+    # An `Instrumentation` recording API and method calls.
+    instrumentation = None
+    # The Redis connection, when Redis is used.
+    redis = None
+    # Public methods that aren't recorded as operations: accessors, and helpers cheap enough to be called once per track.
+    _uninstrumented = ("add_scope", "remove_scope", "get_scopes", "get_stats", "get_prometheus_stats", "create_uri",
+                      "check_track_is_playable", "get_track_details")
+
+    def get_stats(self) -> dict:
+        """
+        Returns the recorded stats: per endpoint (`api`) and per method (`operations`) call counts, errors, retries, bytes and latency histograms,
+        along with the counters of the scheduler and the caches (`sources`).
+        """
+        return self.instrumentation.get_stats() if self.instrumentation else {}
+
+    def get_prometheus_stats(self) -> str:
+        """
+        Returns the recorded stats in the Prometheus text exposition format.
+        """
+        return self.instrumentation.prometheus() if self.instrumentation else ""
+
+    def _connect_redis(self, host=None, port=None):
+        import redis
+        return redis.Redis(
+            host=host,
+            port=port,
+            password=self._redis_pass
+        )
+
+    def _create_auth_manager(self, use_redis=False, cache_path=None, username=None, use_cache_handler=True, memory_mode=True, host=None, port=None):
+        """
+        Returns the `SpotifyOAuth` manager for the given cache settings. When Redis is used the connection is kept in `self.redis`.
+        """
+        # spotipy takes a while to import, so it's only imported once a client is actually needed.
+        from spotipy.oauth2 import SpotifyOAuth, CacheFileHandler
+        from spotipy.cache_handler import MemoryCacheHandler, RedisCacheHandler
+        try:
+            if use_cache_handler:
+                if use_redis:
+                    if self.redis is None: self.redis = self._connect_redis(host=host, port=port)
+                    return SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str, cache_handler=RedisCacheHandler(self.redis))
+                elif memory_mode:
+                    return SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str, cache_handler=MemoryCacheHandler())
+                else:
+                    return SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str, cache_handler=CacheFileHandler(cache_path=cache_path, username=username))
+            elif cache_path:
+                return SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str, cache_path=cache_path, username=username)
+            else:
+                return SpotifyOAuth(client_id=self._client_id, client_secret=self._client_secret, redirect_uri=self._redirect_uri, scope=self._scope_str)
+        except Exception as e:
+            print("Auth Manager couldn't be generated.")
+            raise e
+
+    @staticmethod
+    def get_id(url: str, type="track"):
+        return url.split(type+"/")[1].split('?')[0]
+
+    def _parse_id(self, value: str, type="track"):
+        """
+        Returns the ID out of a Spotify url, URI or bare ID.
+        """
+        if type+"/" in value:
+            return self.get_id(url=value, type=type)
+        return value.split(":")[-1]
+
+    def create_uri(self, url: str=None, id=None, type="track"):
+        if not id: id = self.get_id(url=url, type=type)
+        return f'spotify:{type}:{id}'
+
+    @staticmethod
+    def _is_playable(track, market=None) -> bool:
+        """
+        Checks if the track is available in `market`, or in any market if not given. Takes a `TrackRecord`, a track object or a playlist item.
+        """
+        if isinstance(track, TrackRecord):
+            if market is not None and track.markets is not None:
+                return market in track.markets
+            return track.playable
+        if 'track' in track and 'available_markets' not in track and 'is_playable' not in track:
+            track = track['track']
+        if 'available_markets' in track:
+            markets = track['available_markets']
+            return market in markets if market else len(markets)>0
+        # Tracks fetched for a market only say whether they are playable there.
+        return track.get('is_playable')==True
+
+    def _build_track_details(self, song: dict) -> TrackRecord:
+        record = TrackRecord.from_json(song, playable=self._is_playable(song), loader=self._track_loader)
+        if self.playability is not None: self.playability.update([record])
+        return record
+
+    @staticmethod
+    def _is_hydrated(song: dict) -> bool:
+        """
+        Checks if a track object from a paging response carries everything `_build_track_details` needs.
+        """
+        return 'album' in song and ('available_markets' in song or 'is_playable' in song)
+
+    def _split_items(self, iterable):
+        """
+        Returns the track objects of the given playlist/album items along with the URIs that still have to be fetched.
+        """
+        # Playlist items wrap the track object, album items are the (simplified) track object itself.
+        # Deleted and local tracks can't be looked up so they are left out.
+        songs = [item.get('track', item) for item in iterable]
+        songs = [song for song in songs if song and not song.get('is_local')]
+        missing = [song['uri'] for song in songs if not self._is_hydrated(song)]
+        return songs, missing
+
+    def _distribute(self, songs, fetched, avoid_unavailable):
+        track_details_list = [self._build_track_details(song) if self._is_hydrated(song) else fetched[song['uri']] for song in songs]
+        track_details_list = [temp for temp in track_details_list if temp is not None]
+        return self._split_details(track_details_list, avoid_unavailable)
+
+    @staticmethod
+    def _split_details(track_details_list, avoid_unavailable):
+        unplayable_tracks_list = []
+        uri_list = []
+        for temp in track_details_list:
+            if not temp['playable']:
+                unplayable_tracks_list.append(temp['uri'])
+                if avoid_unavailable: continue
+            uri_list.append(temp['uri'])
+        return track_details_list, unplayable_tracks_list, uri_list
+
+    @staticmethod
+    def _to_uri(track) -> str:
+        return track if isinstance(track, str) else track['uri']
+
+    def _track_set(self, track_details_list, unplayable_tracks_list):
+        total_size = len(track_details_list)
+        unplayable_tracks_size = len(unplayable_tracks_list)
+        playable_size = total_size - unplayable_tracks_size
+        return TrackSetDetails(total_size=total_size, playable_size=playable_size, detailed_list=track_details_list, unplayable_list=unplayable_tracks_list, loader=self._track_loader)
+
+    def get_difference(self, list1, list2, mode="to_be_added"):
+        """
+        Returns the tracks of `list2` missing from `list1` ("to_be_added") or the tracks of `list1` missing from `list2` ("to_be_removed").
+        """
+        diff = PlaylistDiff(list1, list2)
+        if mode=="to_be_added":
+            return diff.missing(0, 1)
+        return diff.difference(0, 1)
+
+    def get_difference_multi(self, main, *lists, mode="to_be_added"):
+        """
+        Returns the tracks of any of the `lists` missing from `main` ("to_be_added") or the tracks of `main` present in none of the `lists` ("to_be_removed").
+        """
+        diff = PlaylistDiff(main, *lists)
+        if mode=="to_be_removed":
+            return diff.difference(0)
+        return diff.missing(0)
+
+    @staticmethod
+    def _first_search_id(results: dict):
+        return results["tracks"]["items"][0]["external_urls"]["spotify"].split("track/")[1]
@@ -0,0 +1,299 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from SpotifyUtil.records import TrackRecord
+
+
+class SQLiteStore:
+    """
+    A small JSON key-value store on top of a SQLite table. Entries older than `ttl` seconds are treated as missing.
+    """
+    def __init__(self, path, table="tracks", ttl=None):
+        import sqlite3
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)")
+
+    def get_many(self, keys) -> dict:
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for idx in range(0, len(keys), 500):
+                chunk = keys[idx:idx+500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({','.join('?' * len(chunk))}) AND (expires IS NULL OR expires > ?)",
+                    (*chunk, time.time())
+                )
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: dict):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), expires) for key, value in items.items()]
+            )
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def delete(self, keys):
+        with self._lock, self._conn:
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in keys])
+
+    def close(self):
+        self._conn.close()
+
+
+class RedisStore:
+    """
+    The same interface as `SQLiteStore` on an existing `redis.Redis` connection. Keys are prefixed with `prefix`.
+    """
+    def __init__(self, redis, prefix="spotifyutil:track:", ttl=None):
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get_many(self, keys) -> dict:
+        keys = list(keys)
+        if not keys: return {}
+        values = self.redis.mget([self.prefix + key for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: dict):
+        pipe = self.redis.pipeline()
+        for key, value in items.items():
+            pipe.set(self.prefix + key, json.dumps(value), ex=int(self.ttl) if self.ttl else None)
+        pipe.execute()
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def delete(self, keys):
+        keys = list(keys)
+        if keys: self.redis.delete(*[self.prefix + key for key in keys])
+
+
+class TrackCache:
+    """
+    Caches tracks as `TrackRecord`s by track ID in an in-memory LRU of at most `max_size` tracks, optionally backed by a persistent tier.\n
+    The records are the ones handed out to callers, so keeping them costs little more than the LRU entries. The full track JSON isn't kept.\n
+    Params:\n
+    - `ttl` -> Seconds a cached track is considered fresh. Set to None to keep tracks until they are evicted.\n
+    - `path` -> Path of a SQLite file to use as the persistent tier. (Optional)\n
+    - `redis` -> A `redis.Redis` connection to use as the persistent tier instead of SQLite. (Optional)\n
+    - `loader` -> The loader given to records read back from the persistent tier. (Optional)
+    """
+    def __init__(self, max_size=10000, ttl=86400, path=None, redis=None, loader=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.loader = loader
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.store = None
+        if redis is not None:
+            self.store = RedisStore(redis, prefix="spotifyutil:record:", ttl=ttl)
+        elif path:
+            self.store = SQLiteStore(path, table="records", ttl=ttl)
+        self.stats = {"hits": 0, "misses": 0, "store_hits": 0, "evictions": 0}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, value):
+        # Callers hold the lock.
+        self._memory[key] = (time.monotonic() + self.ttl if self.ttl else None, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_many(self, keys) -> dict:
+        """
+        Returns the cached tracks among `keys` as a dict of track ID to `TrackRecord`.
+        """
+        keys = list(keys)
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None or (entry[0] is not None and entry[0] <= now):
+                    self._memory.pop(key, None)
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = entry[1]
+        if missing and self.store is not None:
+            stored = {key: TrackRecord.from_dict(value, loader=self.loader) for key, value in self.store.get_many(missing).items()}
+            with self._lock:
+                for key, value in stored.items():
+                    self._remember(key, value)
+                self.stats["store_hits"] += len(stored)
+            found.update(stored)
+        with self._lock:
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: dict):
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, value)
+        if items and self.store is not None:
+            self.store.set_many({key: value.to_dict() for key, value in items.items()})
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def invalidate(self, keys=None):
+        """
+        Drops the given track IDs from every tier. Drops the whole in-memory tier if no keys are given.
+        """
+        with self._lock:
+            if keys is None:
+                self._memory.clear()
+                return
+            keys = list(keys)
+            for key in keys:
+                self._memory.pop(key, None)
+        if self.store is not None:
+            self.store.delete(keys)
+
+
+class PlaylistCache:
+    """
+    Caches the `TrackRecord`s of playlists against their `snapshot_id`, so an unchanged playlist doesn't have to be fetched again.\n
+    The markets of a track can change without the playlist's snapshot changing, so cached playlists also expire after `ttl` seconds.\n
+    Params:\n
+    - `ttl` -> Seconds a cached playlist is considered fresh. Set to None to keep playlists until their snapshot changes.\n
+    - `path` -> Path of a SQLite file to keep the playlists in between runs. (Optional)\n
+    - `loader` -> The loader given to records read back from the SQLite file. (Optional)
+    """
+    def __init__(self, path=None, loader=None, ttl=86400):
+        self.loader = loader
+        self.ttl = ttl
+        self._playlists = {}
+        self._lock = threading.Lock()
+        self.store = SQLiteStore(path, table="playlists", ttl=ttl) if path else None
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(playlist_id, market=None):
+        return f"{playlist_id}:{market or ''}"
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def get(self, playlist_id, snapshot_id, market=None):
+        """
+        Returns the cached track details of the playlist if they were stored for `snapshot_id`, otherwise None.
+        """
+        key = self._key(playlist_id, market)
+        with self._lock:
+            entry = self._playlists.get(key)
+            if entry is not None and entry["expires"] is not None and entry["expires"] <= time.monotonic():
+                del self._playlists[key]
+                entry = None
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                # What's left of the store's TTL isn't known, so the entry gets a whole one again.
+                entry = {"snapshot_id": entry["snapshot_id"], "tracks": [TrackRecord.from_dict(track, loader=self.loader) for track in entry["tracks"]], "expires": self._expires()}
+        hit = entry is not None and entry["snapshot_id"] == snapshot_id
+        with self._lock:
+            self.stats["hits" if hit else "misses"] += 1
+            if hit: self._playlists[key] = entry
+        return entry["tracks"] if hit else None
+
+    def _expires(self):
+        return time.monotonic() + self.ttl if self.ttl else None
+
+    def set(self, playlist_id, snapshot_id, tracks: list, market=None):
+        key = self._key(playlist_id, market)
+        entry = {"snapshot_id": snapshot_id, "tracks": tracks, "expires": self._expires()}
+        with self._lock:
+            self._playlists[key] = entry
+        self._persist(key, entry)
+
+    def _persist(self, key, entry):
+        if self.store is not None:
+            self.store.set(key, {"snapshot_id": entry["snapshot_id"], "tracks": [track.to_dict() for track in entry["tracks"]]})
+
+    def _entries(self, playlist_id):
+        prefix = self._key(playlist_id)
+        with self._lock:
+            return [(key, entry) for key, entry in self._playlists.items() if key.startswith(prefix)]
+
+    def is_cached(self, playlist_id) -> bool:
+        return bool(self._entries(playlist_id))
+
+    def apply(self, playlist_id, snapshot_id, added: list=None, removed_uris=None, before=None):
+        """
+        Updates the cached versions of a playlist after tracks were added to (`added`, as track details) or removed from it.\n
+        With `before`, the snapshot the playlist had just before the change, versions cached at another snapshot are dropped instead,
+        since they miss whatever changed in between.
+        """
+        removed_uris = set(removed_uris or ())
+        for key, entry in self._entries(playlist_id):
+            if before is not None and entry["snapshot_id"] != before:
+                with self._lock:
+                    self._playlists.pop(key, None)
+                if self.store is not None: self.store.delete([key])
+                continue
+            tracks = [track for track in entry["tracks"] if track['uri'] not in removed_uris]
+            tracks.extend(added or ())
+            entry = {"snapshot_id": snapshot_id, "tracks": tracks, "expires": entry["expires"]}
+            with self._lock:
+                self._playlists[key] = entry
+            self._persist(key, entry)
+
+    def update_tracks(self, records: dict):
+        """
+        Replaces the cached records of the given tracks, a dict of track ID to `TrackRecord`, in every cached playlist,
+        e.g. after their markets were fetched again. Playlists cached for a market only say if a track is playable there, so they are dropped instead.
+        """
+        with self._lock:
+            entries = list(self._playlists.items())
+        for key, entry in entries:
+            if not any(track.id in records for track in entry["tracks"]):
+                continue
+            if not key.endswith(":"):
+                with self._lock:
+                    self._playlists.pop(key, None)
+                if self.store is not None: self.store.delete([key])
+                continue
+            entry = dict(entry, tracks=[records.get(track.id, track) for track in entry["tracks"]])
+            with self._lock:
+                self._playlists[key] = entry
+            self._persist(key, entry)
+
+    def invalidate(self, playlist_id):
+        keys = [key for key, _ in self._entries(playlist_id)]
+        with self._lock:
+            for key in keys:
+                self._playlists.pop(key, None)
+        if self.store is not None:
+            self.store.delete(keys)
@@ -0,0 +1,125 @@
+from array import array
+
+
+def _to_bitset(indices, size) -> int:
+    # Builds the bit string once and lets int() parse it, instead of OR-ing one shifted int per index.
+    if not size:
+        return 0
+    bits = bytearray(b"0") * size
+    for idx in indices:
+        bits[idx] = 49
+    bits.reverse()
+    return int(bits, 2)
+
+
+def _to_flags(bitset, size) -> str:
+    """
+    Returns a string whose character at index `i` is "1" if bit `i` of `bitset` is set.
+    """
+    return bin(bitset)[:1:-1].ljust(size, "0")
+
+
+class PlaylistDiff:
+    """
+    Set algebra over any number of track lists (URIs, IDs or `TrackSetDetails`), e.g. the tracks of several playlists.\n
+    Every track is interned to an integer once, each list becomes an array of those integers plus a bitset,
+    and the operations work on the bitsets. Results are lists of tracks in order of first appearance.
+    """
+    def __init__(self, *lists):
+        self.tracks = []
+        self._index = {}
+        self.lists = [self._intern(li) for li in lists]
+        self.bitsets = [_to_bitset(li, len(self.tracks)) for li in self.lists]
+
+    def _intern(self, tracks) -> array:
+        if hasattr(tracks, 'uris'):
+            tracks = tracks.uris
+        index = self._index
+        interned = array('l')
+        for track in tracks:
+            idx = index.get(track)
+            if idx is None:
+                idx = index[track] = len(self.tracks)
+                self.tracks.append(track)
+            interned.append(idx)
+        return interned
+
+    def _select(self, bitset, sources) -> list:
+        flags = _to_flags(bitset, len(self.tracks))
+        emitted = bytearray(len(self.tracks))
+        result = []
+        for source in sources:
+            for idx in self.lists[source]:
+                if flags[idx] == "1" and not emitted[idx]:
+                    emitted[idx] = 1
+                    result.append(self.tracks[idx])
+        return result
+
+    def _which(self, which):
+        return list(which) if which else list(range(len(self.lists)))
+
+    def union(self, *which) -> list:
+        """
+        Tracks present in any of the lists. Defaults to every list if none are given by position.
+        """
+        which = self._which(which)
+        bitset = 0
+        for idx in which:
+            bitset |= self.bitsets[idx]
+        return self._select(bitset, which)
+
+    def intersection(self, *which) -> list:
+        """
+        Tracks present in all of the lists. Defaults to every list if none are given by position.
+        """
+        which = self._which(which)
+        if not which:
+            return []
+        bitset = self.bitsets[which[0]]
+        for idx in which[1:]:
+            bitset &= self.bitsets[idx]
+        return self._select(bitset, which[:1])
+
+    def difference(self, main=0, *others) -> list:
+        """
+        Tracks of list `main` present in none of the `others`. Defaults to every other list.
+        """
+        others = others or [idx for idx in range(len(self.lists)) if idx != main]
+        bitset = 0
+        for idx in others:
+            bitset |= self.bitsets[idx]
+        return self._select(self.bitsets[main] & ~bitset, [main])
+
+    def missing(self, main=0, *others) -> list:
+        """
+        Tracks of the `others` that list `main` doesn't have. Defaults to every other list.
+        """
+        others = others or [idx for idx in range(len(self.lists)) if idx != main]
+        bitset = 0
+        for idx in others:
+            bitset |= self.bitsets[idx]
+        return self._select(bitset & ~self.bitsets[main], others)
+
+    def duplicates(self, *which) -> list:
+        """
+        Tracks present in more than one of the lists.
+        """
+        which = self._which(which)
+        seen = duplicated = 0
+        for idx in which:
+            duplicated |= seen & self.bitsets[idx]
+            seen |= self.bitsets[idx]
+        return self._select(duplicated, which)
+
+    def repeated(self, which=0) -> list:
+        """
+        Tracks appearing more than once within a single list.
+        """
+        seen = bytearray(len(self.tracks))
+        result = []
+        for idx in self.lists[which]:
+            if seen[idx] == 1:
+                result.append(self.tracks[idx])
+            if seen[idx] < 2:
+                seen[idx] += 1
+        return result
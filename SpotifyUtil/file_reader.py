@@ -7,5 +7,6 @@ class FileReader:
         songs = []
         with open(file_path, "r") as file:
             for line in file:
-                songs.append(line)
+                line = line.strip()
+                if line: songs.append(line)
         return songs
\ No newline at end of file
@@ -0,0 +1,296 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import weakref
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MemorySink:
+    """
+    Aggregates events in memory: call counts, errors, retries, bytes and a latency histogram per API endpoint and per operation.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.api = {}
+        self.operations = {}
+
+    def _entry(self, table, name):
+        entry = table.get(name)
+        if entry is None:
+            entry = table[name] = {"count": 0, "errors": 0, "retries": 0, "bytes_in": 0, "bytes_out": 0, "total_time": 0.0, "max_time": 0.0, "buckets": [0] * (len(self.buckets) + 1)}
+        return entry
+
+    def emit(self, event: dict):
+        table = self.api if event["type"] == "api" else self.operations
+        with self._lock:
+            entry = self._entry(table, event["name"])
+            entry["count"] += 1
+            entry["errors"] += not event["ok"]
+            entry["retries"] += event.get("retry", False)
+            entry["bytes_in"] += event.get("bytes_in", 0)
+            entry["bytes_out"] += event.get("bytes_out", 0)
+            entry["total_time"] += event["elapsed"]
+            entry["max_time"] = max(entry["max_time"], event["elapsed"])
+            idx = next((idx for idx, bound in enumerate(self.buckets) if event["elapsed"] <= bound), len(self.buckets))
+            entry["buckets"][idx] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "api": {name: dict(entry, buckets=list(entry["buckets"])) for name, entry in self.api.items()},
+                "operations": {name: dict(entry, buckets=list(entry["buckets"])) for name, entry in self.operations.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.api.clear()
+            self.operations.clear()
+
+
+class JsonLinesSink:
+    """
+    Appends every event as a JSON line to the file at `path`.\n
+    The file is kept open and written through a buffer, which is flushed by the first event `flush_interval` seconds after the last flush, by `flush` and `close`, and at exit.
+    """
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._flushed = 0.0
+
+    def emit(self, event: dict):
+        line = json.dumps(event)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+                self._finalizer = weakref.finalize(self, self._file.close)
+            self._file.write(line + "\n")
+            now = time.monotonic()
+            if now - self._flushed >= self.flush_interval:
+                self._file.flush()
+                self._flushed = now
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._finalizer()
+                self._file = None
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def to_prometheus(stats: dict, buckets=LATENCY_BUCKETS, prefix="spotifyutil") -> str:
+    """
+    Renders the stats of `Instrumentation.get_stats` in the Prometheus text exposition format.
+    """
+    lines = []
+    for kind, label in (("api", "endpoint"), ("operations", "operation")):
+        metric = f"{prefix}_{'api' if kind == 'api' else 'operation'}"
+        entries = stats.get(kind, {})
+        for suffix, key, help_text in (("calls_total", "count", "Calls made"), ("errors_total", "errors", "Calls that raised"),
+                                       ("retries_total", "retries", "Calls that were retries"),
+                                       ("received_bytes_total", "bytes_in", "Response bytes"), ("sent_bytes_total", "bytes_out", "Request bytes")):
+            lines.append(f"# HELP {metric}_{suffix} {help_text}.")
+            lines.append(f"# TYPE {metric}_{suffix} counter")
+            lines.extend(f'{metric}_{suffix}{{{label}="{_label(name)}"}} {entry[key]}' for name, entry in entries.items())
+        lines.append(f"# HELP {metric}_latency_seconds Latency of the calls.")
+        lines.append(f"# TYPE {metric}_latency_seconds histogram")
+        for name, entry in entries.items():
+            cumulative = 0
+            for bound, count in zip((*buckets, "+Inf"), entry["buckets"]):
+                cumulative += count
+                lines.append(f'{metric}_latency_seconds_bucket{{{label}="{_label(name)}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_latency_seconds_sum{{{label}="{_label(name)}"}} {entry["total_time"]}')
+            lines.append(f'{metric}_latency_seconds_count{{{label}="{_label(name)}"}} {entry["count"]}')
+    for source, values in stats.get("sources", {}).items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {prefix}_{source}_{key} gauge")
+                lines.append(f"{prefix}_{source}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class Instrumentation:
+    """
+    Records every Spotify API call and every public `SpotifyUtil` method call, and sends the events to `sinks`.\n
+    Params:\n
+    - `sinks` -> Where events go. Defaults to a single `MemorySink`, which `get_stats` and `prometheus` read from.\n
+    - `profile` -> Run operations under cProfile. True profiles every operation, a set of names only those.\n
+    - `profile_dir` -> Directory to dump the cProfile stats of each profiled operation to. Otherwise only the latest stats per operation are kept in `profiles`.\n
+    - `tracer` -> Called as `tracer(name, phase, elapsed)` with phase "start" or "end" around every operation. (Optional)
+    """
+    def __init__(self, sinks=None, profile=False, profile_dir=None, tracer=None):
+        self.sinks = sinks if sinks is not None else [MemorySink()]
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.tracer = tracer
+        self.profiles = {}
+        self.sources = {}
+        self._local = threading.local()
+        self._profiled = 0
+
+    def emit(self, event: dict):
+        event.setdefault("ts", time.time())
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def add_source(self, name, get_stats):
+        """
+        Adds the counters returned by `get_stats()` (e.g. of a scheduler or a cache) to the stats and the Prometheus export.
+        """
+        self.sources[name] = get_stats
+
+    def count_bytes(self, received=0, sent=0):
+        """
+        Adds transferred bytes to the API call running on this thread.
+        """
+        local = self._local
+        local.bytes_in = getattr(local, 'bytes_in', 0) + received
+        local.bytes_out = getattr(local, 'bytes_out', 0) + sent
+
+    def record_api(self, name, elapsed, ok, retry=False, bytes_in=0, bytes_out=0):
+        self.emit({"type": "api", "name": name, "elapsed": elapsed, "ok": ok, "retry": retry, "bytes_in": bytes_in, "bytes_out": bytes_out})
+
+    def record_operation(self, name, elapsed, ok):
+        self.emit({"type": "operation", "name": name, "elapsed": elapsed, "ok": ok})
+
+    def api_call(self, name, fn, /, *args, retry=False, **kwargs):
+        """
+        Calls `fn` and records it as one call to the endpoint `name`, with the bytes passed to `count_bytes` meanwhile.
+        """
+        local = self._local
+        local.bytes_in = local.bytes_out = 0
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self.record_api(name, time.perf_counter() - start, ok, retry=retry, bytes_in=local.bytes_in, bytes_out=local.bytes_out)
+
+    def _should_profile(self, name):
+        if self.profile is True:
+            return True
+        return bool(self.profile) and name in self.profile
+
+    def operation(self, name, fn, /, *args, **kwargs):
+        """
+        Calls `fn` and records it as one run of the operation `name`. Nested operations are recorded too, but only the outermost is profiled.\n
+        `name` and `fn` are positional-only, so that `fn` can take arguments of the same name, e.g. `create_playlist(name=...)`.
+        """
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        local.depth = depth + 1
+        profiler = None
+        if depth == 0 and self._should_profile(name):
+            import cProfile
+            profiler = cProfile.Profile()
+        if self.tracer: self.tracer(name, "start", 0.0)
+        start = time.perf_counter()
+        ok = False
+        try:
+            if profiler is not None:
+                result = profiler.runcall(fn, *args, **kwargs)
+            else:
+                result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            local.depth = depth
+            self.record_operation(name, elapsed, ok)
+            if self.tracer: self.tracer(name, "end", elapsed)
+            if profiler is not None:
+                self._save_profile(name, profiler)
+
+    async def aoperation(self, name, fn, /, *args, **kwargs):
+        """
+        Awaitable version of `operation` for coroutine functions. These are timed and traced but never profiled,
+        since cProfile can't tell one task's time from another's.
+        """
+        if self.tracer: self.tracer(name, "start", 0.0)
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = await fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            self.record_operation(name, elapsed, ok)
+            if self.tracer: self.tracer(name, "end", elapsed)
+
+    def _save_profile(self, name, profiler):
+        import pstats
+        self.profiles[name] = pstats.Stats(profiler)
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            self._profiled += 1
+            profiler.dump_stats(os.path.join(self.profile_dir, f"{name}-{self._profiled}.prof"))
+
+    def get_stats(self) -> dict:
+        memory = next((sink for sink in self.sinks if isinstance(sink, MemorySink)), None)
+        stats = memory.get_stats() if memory else {"api": {}, "operations": {}}
+        stats["sources"] = {name: get_stats() for name, get_stats in self.sources.items()}
+        return stats
+
+    def prometheus(self) -> str:
+        return to_prometheus(self.get_stats())
+
+    def reset(self):
+        for sink in self.sinks:
+            if isinstance(sink, MemorySink): sink.reset()
+
+
+def instrumented(method):
+    """
+    Records calls of the method as operations of the instance's `instrumentation`, if it has one.
+    """
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            instrumentation = getattr(self, 'instrumentation', None)
+            if instrumentation is None:
+                return await method(self, *args, **kwargs)
+            return await instrumentation.aoperation(method.__name__, method, self, *args, **kwargs)
+    else:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrumentation = getattr(self, 'instrumentation', None)
+            if instrumentation is None:
+                return method(self, *args, **kwargs)
+            return instrumentation.operation(method.__name__, method, self, *args, **kwargs)
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_public_methods(cls):
+    """
+    Class decorator applying `instrumented` to every public method of the class, inherited ones included.\n
+    Generator methods are left alone, as wrapping them would only time the creation of the generator.
+    The API calls they make are still recorded. So are the methods named in the class's `_uninstrumented`.
+    """
+    skip = set(getattr(cls, '_uninstrumented', ()))
+    for name in dir(cls):
+        if name.startswith('_') or name in skip:
+            continue
+        attr = inspect.getattr_static(cls, name)
+        if isinstance(attr, (staticmethod, classmethod, property)) or not inspect.isfunction(attr) or inspect.isgeneratorfunction(attr) or getattr(attr, '__instrumented__', False):
+            continue
+        setattr(cls, name, instrumented(attr))
+    return cls
@@ -0,0 +1,120 @@
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from SpotifyUtil.scheduler import RequestScheduler, SharedTokenBucket
+
+
+log = logging.getLogger(__name__)
+
+# Manifest operation -> SpotifyUtil method.
+OPERATIONS = {
+    "add": "add_songs_to_playlist",
+    "add_from_file": "add_songs_to_playlist_from_file",
+    "add_liked": "add_liked_songs_to_playlist",
+    "sync": "sync_playlist",
+    "clear": "clear_playlist",
+    "unplayable": "create_unplayable_track_playlist",
+}
+
+# Set in every worker process by `_init_worker`.
+_bucket = None
+_max_in_flight = 8
+
+
+class JobResult:
+    def __init__(self, id, user, op, ok, result=None, error=None, elapsed=0.0):
+        self.id = id
+        self.user = user
+        self.op = op
+        self.ok = ok
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f"JobResult(id={self.id!r}, user={self.user!r}, op={self.op!r}, ok={self.ok}, elapsed={self.elapsed:.2f})"
+
+
+def _init_worker(bucket, max_in_flight):
+    global _bucket, _max_in_flight
+    _bucket = bucket
+    _max_in_flight = max_in_flight
+
+
+def _run_user_jobs(user, config, jobs):
+    """
+    Runs all the jobs of one user in order with a single client, created when the first job needs it.
+    """
+    from SpotifyUtil.SpotifyUtil import SpotifyUtil
+    client = None
+    results = []
+    for idx, job in jobs:
+        start = time.monotonic()
+        try:
+            if client is None:
+                # The shared bucket is the only rate limit. Without one (`rate=None`) there's none at all, not a bucket per process.
+                client = SpotifyUtil(**config, scheduler=RequestScheduler(rate=None, bucket=_bucket, max_in_flight=_max_in_flight))
+            result = getattr(client, OPERATIONS[job["op"]])(**job.get("args", {}))
+            results.append((idx, JobResult(job.get("id", idx), user, job["op"], True, result=_portable(result), elapsed=time.monotonic() - start)))
+        except Exception as e:
+            log.debug(f"Job {job.get('id', idx)} of {user} failed: {e}")
+            results.append((idx, JobResult(job.get("id", idx), user, job["op"], False, error=f"{type(e).__name__}: {e}", elapsed=time.monotonic() - start)))
+    return results
+
+
+def _portable(result):
+    # Results have to be pickled back to the parent, so anything richer than plain data is turned into its repr.
+    try:
+        json.dumps(result)
+        return result
+    except TypeError:
+        return repr(result)
+
+
+class JobRunner:
+    """
+    Runs a manifest of operations for many users over a process pool.\n
+    The manifest is a dict (or the path of a JSON file) like:\n
+    ```python
+    {
+        "users": {"alice": {"cache_path": ".cache-alice", "memory_mode": False}},
+        "jobs": [
+            {"id": "mirror", "user": "alice", "op": "sync", "args": {"source_url": "...", "target_url": "..."}},
+            {"user": "alice", "op": "clear", "args": {"playlist_url": "..."}}
+        ]
+    }
+    ```
+    `users` maps a user to the keyword arguments of their `SpotifyUtil`. Supported operations are the keys of `OPERATIONS`.\n
+    All the jobs of a user run in order in the same process with one client, which authenticates on that user's first job.
+    Different users run in parallel, all drawing from one shared rate limit of `rate` calls per second.
+    """
+    def __init__(self, manifest, processes=None, rate=10.0, burst=None, max_in_flight=8):
+        if isinstance(manifest, str):
+            with open(manifest, "r") as file:
+                manifest = json.load(file)
+        unknown = {job["op"] for job in manifest["jobs"]} - set(OPERATIONS)
+        if unknown:
+            raise ValueError(f"Unknown operations in manifest: {', '.join(sorted(unknown))}")
+        self.users = manifest.get("users", {})
+        self.jobs = manifest["jobs"]
+        self.processes = processes
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+
+    def run(self) -> list:
+        """
+        Runs every job and returns their `JobResult`s in manifest order.
+        """
+        by_user = {}
+        for idx, job in enumerate(self.jobs):
+            by_user.setdefault(job["user"], []).append((idx, job))
+        bucket = SharedTokenBucket(self.rate, self.burst) if self.rate else None
+        results = [None] * len(self.jobs)
+        with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker, initargs=(bucket, self.max_in_flight)) as executor:
+            futures = [executor.submit(_run_user_jobs, user, self.users.get(user, {}), jobs) for user, jobs in by_user.items()]
+            for future in as_completed(futures):
+                for idx, result in future.result():
+                    results[idx] = result
+        return results
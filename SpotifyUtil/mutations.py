@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from SpotifyUtil.stream import chunked
+
+
+log = logging.getLogger(__name__)
+
+
+class _Pending:
+    def __init__(self):
+        self.adds = []
+        self.removes = {}
+        # Adds of an interrupted import, applied or still pending, read back from the journal. Adding one of them again
+        # while the import runs again skips it instead of queueing it twice. Cleared once that run ends, see `MutationQueue.importing`.
+        self.resumed = Counter()
+
+    def __bool__(self):
+        return bool(self.adds or self.removes)
+
+
+class MutationQueue:
+    """
+    Queues track adds and removes per playlist and applies them in batches of `batch_size` when flushed.\n
+    Removing a track cancels its pending adds to the same playlist. Removes go out before adds and concurrently,
+    adds go out in order, one batch after another per playlist, and different playlists are flushed concurrently.\n
+    When `journal_path` is given, the batches of a flush are appended there before the first request, and so is every applied batch.
+    While an import into a playlist runs (see `importing`), its lines are kept across flushes, so the journal holds every batch of the import so far.
+    The next queue created with the same path queues the batches left by an interrupted import again, and skips the adds it already applied
+    when the import is run again. Flushes run one at a time, so that the journal is written in the order the batches go out.\n
+    Params:\n
+    - `send_add` -> Called with a playlist ID and a list of URIs, adds them and returns the new `snapshot_id`.\n
+    - `send_remove` -> Called with a playlist ID and a list of URIs, removes all of their occurrences and returns the new `snapshot_id`.\n
+    - `on_applied` -> Called with the playlist ID, the `snapshot_id`, the added and the removed URIs after every applied batch. (Optional)
+    """
+    def __init__(self, send_add, send_remove, journal_path=None, max_workers=4, batch_size=100, on_applied=None):
+        self.send_add = send_add
+        self.send_remove = send_remove
+        self.journal_path = journal_path
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.on_applied = on_applied
+        self._pending = {}
+        # Playlist ID -> no. of imports into it running.
+        self._imports = Counter()
+        self._lock = threading.Lock()
+        # Held for a whole flush, and while the journal is rewritten. Only the one holding it writes the journal.
+        self._flush_lock = threading.Lock()
+        self._load()
+
+    def _get(self, playlist_id) -> _Pending:
+        pending = self._pending.get(playlist_id)
+        if pending is None:
+            pending = self._pending[playlist_id] = _Pending()
+        return pending
+
+    def add(self, playlist_id, uris):
+        with self._lock:
+            pending = self._get(playlist_id)
+            for uri in uris:
+                if pending.resumed[uri]:
+                    pending.resumed[uri] -= 1
+                else:
+                    pending.adds.append(uri)
+
+    def remove(self, playlist_id, uris):
+        with self._lock:
+            pending = self._get(playlist_id)
+            uris = dict.fromkeys(uris)
+            if pending.adds and not uris.keys().isdisjoint(pending.adds):
+                pending.adds = [uri for uri in pending.adds if uri not in uris]
+            for uri in uris:
+                pending.resumed.pop(uri, None)
+            pending.removes.update(uris)
+
+    def pending(self, playlist_id=None) -> dict:
+        """
+        Returns the no. of pending adds and removes of the playlist, or of every playlist with pending mutations.
+        """
+        with self._lock:
+            counts = {pid: {"add": len(pending.adds), "remove": len(pending.removes)} for pid, pending in self._pending.items() if pending}
+        return counts if playlist_id is None else counts.get(playlist_id, {"add": 0, "remove": 0})
+
+    @contextmanager
+    def importing(self, playlist_id):
+        """
+        Marks an import into the playlist while the block runs, e.g. `SpotifyUtil.add_tracks_in_chunks`.
+        Until it ends, the playlist's journal lines are kept, and adds an interrupted run of the import already made or left pending are skipped.
+        Once it ends without an error, and nothing is left pending, those lines and the skipped adds are dropped,
+        so that later adds of the same tracks go out as usual.
+        """
+        with self._lock:
+            self._imports[playlist_id] += 1
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            with self._flush_lock:
+                with self._lock:
+                    self._imports[playlist_id] -= 1
+                    done = ok and self._done(playlist_id)
+                if done: self._forget([playlist_id])
+
+    def _done(self, playlist_id) -> bool:
+        # Called with `_lock` held. Once nothing of the playlist is pending or being imported, what the journal knows of it is dropped.
+        pending = self._get(playlist_id)
+        if pending or self._imports[playlist_id]:
+            return False
+        pending.resumed.clear()
+        return True
+
+    def _read_journal(self) -> list:
+        if not self.journal_path or not os.path.isfile(self.journal_path):
+            return []
+        lines = []
+        with open(self.journal_path, "r") as file:
+            for line in file.read().splitlines():
+                try:
+                    lines.append(json.loads(line))
+                except ValueError:
+                    # The last line may have been cut short by the interruption.
+                    continue
+        return lines
+
+    def _load(self):
+        lines = self._read_journal()
+        if not lines:
+            return
+        plans, applied = {}, {}
+        for line in lines:
+            playlist_id = line["playlist"]
+            if "batch" in line:
+                batches = plans[playlist_id][line["op"]]
+                if line["op"] == "add": applied.setdefault(playlist_id, []).extend(batches[line["batch"]])
+                batches[line["batch"]] = None
+            else:
+                # A new plan holds what was left of the previous one, as leftovers are queued again before the next flush.
+                plans[playlist_id] = {"add": line["add"], "remove": line["remove"]}
+        for playlist_id, batches in plans.items():
+            pending = self._get(playlist_id)
+            for batch in batches["remove"]:
+                if batch is not None: pending.removes.update(dict.fromkeys(batch))
+            for batch in batches["add"]:
+                if batch is not None: pending.adds.extend(batch)
+            pending.resumed.update(pending.adds)
+            pending.resumed.update(applied.get(playlist_id, []))
+        log.debug(f"Resumed the pending mutations of {len(plans)} playlist(s) from {self.journal_path}")
+
+    def _forget(self, playlist_ids):
+        # Called with `_flush_lock` held. Drops the journal lines of the playlists, and the journal once none are left.
+        if not playlist_ids or not self.journal_path or not os.path.isfile(self.journal_path):
+            return
+        lines = [line for line in self._read_journal() if line["playlist"] not in playlist_ids]
+        if not lines:
+            os.remove(self.journal_path)
+            return
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.writelines(json.dumps(line) + "\n" for line in lines)
+        os.replace(tmp_path, self.journal_path)
+
+    def _plan(self, playlist_ids) -> dict:
+        return {
+            playlist_id: {"add": list(chunked(self._pending[playlist_id].adds, self.batch_size)), "remove": list(chunked(self._pending[playlist_id].removes, self.batch_size))}
+            for playlist_id in playlist_ids
+        }
+
+    def flush(self, *playlist_ids) -> dict:
+        """
+        Applies the pending mutations of the given playlists, or of every playlist if none are given,
+        and returns the no. of tracks added and removed per playlist.\n
+        Batches that failed, and the adds of a playlist after a failed batch, stay pending. The first error is raised once the rest are done.
+        """
+        with self._flush_lock:
+            return self._flush(playlist_ids)
+
+    def _flush(self, playlist_ids) -> dict:
+        with self._lock:
+            flushed = [playlist_id for playlist_id in (playlist_ids or list(self._pending)) if self._pending.get(playlist_id)]
+            if not flushed:
+                return {}
+            plan = self._plan(flushed)
+            for playlist_id in flushed:
+                self._pending[playlist_id].adds, self._pending[playlist_id].removes = [], {}
+        results = {playlist_id: {"added": 0, "removed": 0} for playlist_id in flushed}
+        errors = []
+        failed = set()
+        journal = open(self.journal_path, "a") if self.journal_path else None
+        if journal is not None:
+            journal.writelines(json.dumps(dict(plan[playlist_id], playlist=playlist_id)) + "\n" for playlist_id in flushed)
+            journal.flush()
+
+        def applied(playlist_id, op, idx, snapshot_id):
+            batch = plan[playlist_id][op][idx]
+            with self._lock:
+                plan[playlist_id][op][idx] = None
+                results[playlist_id]["added" if op == "add" else "removed"] += len(batch)
+                if journal is not None:
+                    journal.write(json.dumps({"playlist": playlist_id, "op": op, "batch": idx}) + "\n")
+                    journal.flush()
+                if self.on_applied is not None:
+                    self.on_applied(playlist_id, snapshot_id, batch if op == "add" else [], batch if op == "remove" else [])
+
+        def send_remove(playlist_id, idx):
+            try:
+                applied(playlist_id, "remove", idx, self.send_remove(playlist_id, plan[playlist_id]["remove"][idx]))
+            except Exception as e:
+                errors.append(e)
+                failed.add(playlist_id)
+
+        def send_adds(playlist_id):
+            # Adds of a playlist whose removes failed would be undone by retrying those removes, so they wait too.
+            if playlist_id in failed: return
+            for idx, batch in enumerate(plan[playlist_id]["add"]):
+                try:
+                    applied(playlist_id, "add", idx, self.send_add(playlist_id, batch))
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(lambda args: send_remove(*args), [(playlist_id, idx) for playlist_id in flushed for idx in range(len(plan[playlist_id]["remove"]))]))
+                list(executor.map(send_adds, flushed))
+        finally:
+            if journal is not None: journal.close()
+            self._requeue(flushed, plan)
+        if errors:
+            raise errors[0]
+        log.debug(f"Flushed the mutations of {len(flushed)} playlist(s): {results}")
+        return results
+
+    def _requeue(self, flushed, plan):
+        with self._lock:
+            for playlist_id in flushed:
+                left, pending = plan[playlist_id], self._pending[playlist_id]
+                # Mutations queued during the flush came after the ones left over, so those go first.
+                removes = {uri: None for batch in left["remove"] if batch is not None for uri in batch}
+                removes.update(pending.removes)
+                pending.removes = removes
+                pending.adds = [uri for batch in left["add"] if batch is not None for uri in batch] + pending.adds
+            done = [playlist_id for playlist_id in flushed if self._done(playlist_id)]
+        self._forget(done)
@@ -0,0 +1,67 @@
+import threading
+
+
+class PlayabilityIndex:
+    """
+    Maps track IDs to a bitmap of the markets they are available in, one bit per market code.\n
+    Tracks sharing the same (interned) market set share one bitmap, and whole track sets are checked against a market with a single mask.
+    """
+    def __init__(self):
+        self.market_bits = {}
+        self.bitmaps = {}
+        self._by_markets = {}
+        self._lock = threading.Lock()
+
+    def _bitmap(self, markets) -> int:
+        bitmap = self._by_markets.get(markets)
+        if bitmap is None:
+            bitmap = 0
+            for market in markets:
+                bit = self.market_bits.setdefault(market, len(self.market_bits))
+                bitmap |= 1 << bit
+            self._by_markets[markets] = bitmap
+        return bitmap
+
+    def update(self, records):
+        """
+        Indexes the given `TrackRecord`s. Records fetched for a specific market carry no market list and are skipped.
+        """
+        with self._lock:
+            for record in records:
+                if record is not None and record.markets is not None:
+                    self.bitmaps[record.id] = self._bitmap(record.markets)
+
+    def __contains__(self, track_id):
+        return track_id in self.bitmaps
+
+    def __len__(self):
+        return len(self.bitmaps)
+
+    def _mask(self, market=None):
+        # Without a market any bit counts, so the mask is all ones.
+        if market is None:
+            return -1
+        bit = self.market_bits.get(market)
+        return 0 if bit is None else 1 << bit
+
+    def is_playable(self, track_id, market=None):
+        """
+        Returns if the track is available in `market` (in any market if not given), or None if the track isn't indexed.
+        """
+        bitmap = self.bitmaps.get(track_id)
+        return None if bitmap is None else bool(bitmap & self._mask(market))
+
+    def playable(self, track_ids, market=None) -> list:
+        """
+        Returns a flag per track ID telling if it is available in `market`. Tracks that aren't indexed count as unplayable.
+        """
+        mask = self._mask(market)
+        bitmaps = self.bitmaps
+        return [bool(bitmaps.get(track_id, 0) & mask) for track_id in track_ids]
+
+    def unplayable(self, track_ids, market=None) -> list:
+        """
+        Returns the track IDs that aren't available in `market`, keeping their order.
+        """
+        track_ids = list(track_ids)
+        return [track_id for track_id, flag in zip(track_ids, self.playable(track_ids, market=market)) if not flag]
@@ -0,0 +1,130 @@
+from array import array
+
+
+_MARKETS = {}
+
+
+def intern_markets(markets):
+    """
+    Returns a shared frozenset for the given markets, so tracks available in the same markets don't each hold their own copy.
+    """
+    if markets is None:
+        return None
+    markets = frozenset(markets)
+    return _MARKETS.setdefault(markets, markets)
+
+
+class TrackRecord:
+    """
+    The fields of a track this library uses, without the rest of its JSON.\n
+    The full JSON is loaded on demand through `track`. Records can also be read like the old track detail dicts, e.g. `record['uri']`.
+    """
+    __slots__ = ("id", "name", "artist", "duration_ms", "isrc", "markets", "playable", "_loader")
+    _fields = ("id", "uri", "name", "artist", "duration_ms", "isrc", "markets", "playable", "track")
+
+    def __init__(self, id, name, artist, duration_ms=0, isrc=None, markets=None, playable=False, loader=None):
+        self.id = id
+        self.name = name
+        self.artist = artist
+        self.duration_ms = duration_ms
+        self.isrc = isrc
+        self.markets = intern_markets(markets)
+        self.playable = playable
+        self._loader = loader
+
+    @classmethod
+    def from_json(cls, song: dict, playable: bool, loader=None):
+        return cls(
+            id=song['id'],
+            name=song['name'],
+            artist=song['album']['artists'][0]['name'],
+            duration_ms=song.get('duration_ms', 0),
+            isrc=song.get('external_ids', {}).get('isrc'),
+            markets=song.get('available_markets'),
+            playable=playable,
+            loader=loader
+        )
+
+    @property
+    def uri(self):
+        return f"spotify:track:{self.id}"
+
+    @property
+    def track(self):
+        """
+        The full track JSON, loaded through the client that created the record.
+        """
+        return self._loader(self.id) if self._loader else None
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self._fields else default
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "name": self.name, "artist": self.artist, "duration_ms": self.duration_ms, "isrc": self.isrc,
+            "markets": sorted(self.markets) if self.markets is not None else None, "playable": self.playable
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, loader=None):
+        return cls(loader=loader, **data)
+
+    def __eq__(self, other):
+        return isinstance(other, TrackRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"TrackRecord(id={self.id!r}, name={self.name!r}, artist={self.artist!r}, playable={self.playable})"
+
+
+class TrackSetDetails:
+    """
+    A set of tracks stored column by column. Iterating over it, or reading `detailed_list`, gives `TrackRecord`s.
+    """
+    def __init__(self, total_size: int, playable_size: int, detailed_list: list, unplayable_list: list, loader=None):
+        self.total_size = total_size
+        self.playable_size = playable_size
+        self.unplayable_uris = unplayable_list
+        self._loader = loader
+        self.ids = []
+        self.names = []
+        self.artists = []
+        self.durations = array('l')
+        self.isrcs = []
+        self.markets = []
+        self.playable = bytearray()
+        for record in detailed_list:
+            self.append(record)
+
+    def append(self, record: TrackRecord):
+        self.ids.append(record.id)
+        self.names.append(record.name)
+        self.artists.append(record.artist)
+        self.durations.append(record.duration_ms or 0)
+        self.isrcs.append(record.isrc)
+        self.markets.append(record.markets)
+        self.playable.append(bool(record.playable))
+
+    def record(self, idx) -> TrackRecord:
+        return TrackRecord(
+            id=self.ids[idx], name=self.names[idx], artist=self.artists[idx], duration_ms=self.durations[idx],
+            isrc=self.isrcs[idx], markets=self.markets[idx], playable=bool(self.playable[idx]), loader=self._loader
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (self.record(idx) for idx in range(len(self.ids)))
+
+    @property
+    def detailed_list(self) -> list:
+        return list(self)
+
+    @property
+    def uris(self) -> list:
+        return [f"spotify:track:{id}" for id in self.ids]
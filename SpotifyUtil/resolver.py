@@ -0,0 +1,183 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from SpotifyUtil.cache import SQLiteStore
+
+
+def normalize_line(line: str) -> str:
+    """
+    Strips the line and collapses its whitespace, e.g. `"  Song  -  Artist\\n"` becomes `"Song - Artist"`.
+    """
+    return " ".join(line.split())
+
+
+def split_line(line: str):
+    """
+    Splits a normalized "Song - Artist" line into the song and the artist. The artist is None if there's no separator.
+    """
+    song, sep, artist = line.rpartition(" - ")
+    if not sep or not song:
+        return line, None
+    return song, artist
+
+
+def _simplify(text: str) -> str:
+    # Ignores case, punctuation and bracketed parts like "(Remastered 2011)" or "[feat. X]".
+    text = re.sub(r"[\(\[].*?[\)\]]", "", text.lower())
+    return re.sub(r"[^\w]+", "", text)
+
+
+class ResolveReport:
+    """
+    The outcome of resolving search lines:\n
+    - `resolved` -> line to track ID, for lines whose song and artist matched a result.\n
+    - `ambiguous` -> line to candidate track IDs, best guess first, for lines that only gave inexact matches.\n
+    - `failed` -> line to the reason nothing was found.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self.resolved = {}
+        self.ambiguous = {}
+        self.failed = {}
+
+    def ids(self, include_ambiguous=True) -> list:
+        """
+        Returns the track ID of every resolved line in the original order, repeats included.
+        """
+        ids = []
+        for line in self.lines:
+            if line in self.resolved:
+                ids.append(self.resolved[line])
+            elif include_ambiguous and line in self.ambiguous:
+                ids.append(self.ambiguous[line][0])
+        return ids
+
+    def __repr__(self):
+        return f"ResolveReport(resolved={len(self.resolved)}, ambiguous={len(self.ambiguous)}, failed={len(self.failed)})"
+
+
+class SearchResolver:
+    """
+    Resolves "Song - Artist" lines to track IDs with at most `max_workers` searches running at once.\n
+    Lines are normalized and deduplicated first, and results are kept in a query to ID cache, persisted in SQLite if `cache_path` is given.\n
+    Params:\n
+    - `search` -> The search function to use, taking the query and a `limit`, e.g. `spotipy.Spotify.search`.
+    A coroutine function works too, with `aresolve` instead of `resolve`.
+    """
+    def __init__(self, search, cache_path=None, max_workers=8, candidates=5):
+        self.search = search
+        self.max_workers = max_workers
+        self.candidates = candidates
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.store = SQLiteStore(cache_path, table="searches") if cache_path else None
+
+    def _cached(self, keys) -> dict:
+        with self._lock:
+            found = {key: self._cache[key] for key in keys if key in self._cache}
+        missing = [key for key in keys if key not in found]
+        if missing and self.store is not None:
+            stored = self.store.get_many(missing)
+            with self._lock:
+                self._cache.update(stored)
+            found.update(stored)
+        return found
+
+    def _remember(self, results: dict):
+        with self._lock:
+            self._cache.update(results)
+        if results and self.store is not None:
+            self.store.set_many(results)
+
+    def _queries(self, line: str) -> list:
+        song, artist = split_line(line)
+        return [f"track:{song} artist:{artist}", line] if artist else [line]
+
+    def _match(self, line: str, items: list) -> dict:
+        if not items:
+            return {"status": "failed", "ids": []}
+        song, artist = split_line(line)
+        exact = [
+            item for item in items
+            if _simplify(item['name']) == _simplify(song)
+            and (artist is None or any(_simplify(a['name']) == _simplify(artist) for a in item['artists']))
+        ]
+        if exact:
+            return {"status": "resolved", "ids": [exact[0]['id']]}
+        return {"status": "ambiguous", "ids": [item['id'] for item in items]}
+
+    def _lookup(self, line: str) -> dict:
+        items = []
+        for query in self._queries(line):
+            items = self.search(query, limit=self.candidates)["tracks"]["items"]
+            if items: break
+        return self._match(line, items)
+
+    async def _alookup(self, line: str) -> dict:
+        items = []
+        for query in self._queries(line):
+            items = (await self.search(query, limit=self.candidates))["tracks"]["items"]
+            if items: break
+        return self._match(line, items)
+
+    def _prepare(self, lines):
+        """
+        Returns the report to fill in, the cache key of every line, the results already cached and the lines left to search by key.
+        """
+        lines = [normalize_line(line) for line in lines]
+        lines = [line for line in lines if line]
+        keys = {line: line.lower() for line in lines}
+        results = self._cached(list(dict.fromkeys(keys.values())))
+        pending = {key: line for line, key in keys.items() if key not in results}
+        return ResolveReport(lines), keys, results, pending
+
+    @staticmethod
+    def _failure(error):
+        # Rate limited even after the scheduler's retries, the remaining searches would fail too.
+        if getattr(error, 'http_status', None) == 429: raise error
+        return str(error)
+
+    def _fill(self, report, keys, results, fetched, errors) -> ResolveReport:
+        self._remember({key: result for key, result in fetched.items() if result["status"] != "failed"})
+        results.update(fetched)
+        for line, key in keys.items():
+            if key in errors:
+                report.failed[line] = errors[key]
+                continue
+            result = results[key]
+            if result["status"] == "resolved":
+                report.resolved[line] = result["ids"][0]
+            elif result["status"] == "ambiguous":
+                report.ambiguous[line] = result["ids"]
+            else:
+                report.failed[line] = "No results"
+        return report
+
+    def resolve(self, lines) -> ResolveReport:
+        report, keys, results, pending = self._prepare(lines)
+        fetched = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {key: executor.submit(self._lookup, line) for key, line in pending.items()}
+            for key, future in futures.items():
+                try:
+                    fetched[key] = future.result()
+                except Exception as e:
+                    errors[key] = self._failure(e)
+        return self._fill(report, keys, results, fetched, errors)
+
+    async def aresolve(self, lines) -> ResolveReport:
+        """
+        Awaitable version of `resolve`, for a coroutine `search`. Concurrency is left to the searches themselves.
+        """
+        import asyncio
+        report, keys, results, pending = self._prepare(lines)
+        fetched = {}
+        errors = {}
+        outcomes = await asyncio.gather(*(self._alookup(line) for line in pending.values()), return_exceptions=True)
+        for key, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                errors[key] = self._failure(outcome)
+            else:
+                fetched[key] = outcome
+        return self._fill(report, keys, results, fetched, errors)
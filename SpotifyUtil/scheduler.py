@@ -0,0 +1,195 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+log = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    A thread safe token bucket refilled with `rate` tokens per second and holding at most `burst` tokens.
+    """
+    def __init__(self, rate: float, burst: float=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns how many seconds the caller has to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A `TokenBucket` kept in shared memory, so processes started with it draw from the same budget.
+    """
+    def __init__(self, rate: float, burst: float=None):
+        import multiprocessing
+        self.rate = rate
+        self.burst = burst or rate
+        # Wall clock time, since it has to mean the same thing in every process.
+        self._state = multiprocessing.Array('d', [self.burst, time.time()])
+
+    def reserve(self) -> float:
+        with self._state.get_lock():
+            now = time.time()
+            tokens = min(self.burst, self._state[0] + (now - self._state[1]) * self.rate) - 1
+            self._state[0] = tokens
+            self._state[1] = now
+            return max(0.0, -tokens / self.rate)
+
+
+class RequestScheduler:
+    """
+    Runs every Spotify API call through a token bucket rate limit and a cap on concurrent in-flight calls.\n
+    429 and 5xx responses are retried up to `max_retries` times. A `Retry-After` header is honored when present,
+    otherwise the wait is a jittered exponential backoff starting at `backoff_base` seconds and capped at `backoff_cap`.
+    A 429 pauses every call going through the scheduler until the wait is over, not only the one that got it.\n
+    Params:\n
+    - `rate` -> Sustained calls per second. Set to None to disable the rate limit.\n
+    - `burst` -> Calls that can go out back to back before `rate` kicks in. Defaults to `rate`.\n
+    - `max_in_flight` -> Maximum no. of calls running at the same time.\n
+    - `bucket` -> Use an existing bucket instead of creating one, e.g. to share a budget between schedulers.
+    """
+    def __init__(self, rate=10.0, burst=None, max_in_flight=8, max_retries=5, backoff_base=0.5, backoff_cap=30.0, bucket=None):
+        self.bucket = bucket or (TokenBucket(rate, burst) if rate else None)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        # time.monotonic() before which no call goes out, pushed back by every 429.
+        self._not_before = 0.0
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "rate_limit_wait": 0.0, "throttle_time": 0.0, "pause_wait": 0.0}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def _reserve(self) -> float:
+        self._count("calls")
+        delay = self.bucket.reserve() if self.bucket else 0.0
+        if delay: self._count("rate_limit_wait", delay)
+        with self._lock:
+            paused = self._not_before - time.monotonic()
+        if paused > delay:
+            self._count("pause_wait", paused - delay)
+            delay = paused
+        return delay
+
+    def _pause(self, delay: float):
+        with self._lock:
+            self._not_before = max(self._not_before, time.monotonic() + delay)
+
+    @staticmethod
+    def _parse_retry_after(value):
+        """
+        Returns the seconds to wait given by a `Retry-After` header, either a no. of seconds or an HTTP date, or None if it can't be read.
+        """
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def _retry_delay(self, error: Exception, attempt: int):
+        """
+        Returns how long to wait before retrying after `error`, or None if it shouldn't be retried.
+        """
+        # Only Spotify errors carry an http_status, so spotipy doesn't need importing to tell them apart.
+        status = getattr(error, 'http_status', None)
+        if not isinstance(status, int) or not (status == 429 or status >= 500) or attempt >= self.max_retries:
+            return None
+        retry_after = self._parse_retry_after((getattr(error, 'headers', None) or {}).get('Retry-After'))
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.backoff_base)
+        else:
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if status == 429:
+            self._count("throttled")
+            # The quota is shared, so the calls of the other workers would only collect more 429s.
+            self._pause(delay)
+        self._count("retries")
+        self._count("throttle_time", delay)
+        log.debug(f"Got {status} from Spotify, retrying in {delay:.2f}s")
+        return delay
+
+    def call(self, fn, /, *args, **kwargs):
+        attempt = 0
+        while True:
+            delay = self._reserve()
+            if delay: time.sleep(delay)
+            try:
+                with self._slots:
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None: raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def acall(self, fn, /, *args, **kwargs):
+        """
+        Awaitable version of `call` for coroutine functions. Concurrency is left to the caller's own semaphore.
+        """
+        import asyncio
+        attempt = 0
+        while True:
+            delay = self._reserve()
+            if delay: await asyncio.sleep(delay)
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None: raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+
+class ScheduledClient:
+    """
+    Wraps a `spotipy.Spotify` client so that every API method call goes through a `RequestScheduler`.\n
+    With an `Instrumentation`, every attempt is recorded as a call to the endpoint named after the method, retries included.
+    """
+    def __init__(self, client, scheduler: RequestScheduler, instrumentation=None):
+        self._client = client
+        self.scheduler = scheduler
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            def scheduled(*args, **kwargs):
+                return self.scheduler.call(attr, *args, **kwargs)
+            return scheduled
+        def scheduled(*args, **kwargs):
+            attempts = [0]
+            def attempt(*args, **kwargs):
+                attempts[0] += 1
+                return instrumentation.api_call(name, attr, *args, retry=attempts[0] > 1, **kwargs)
+            return self.scheduler.call(attempt, *args, **kwargs)
+        return scheduled
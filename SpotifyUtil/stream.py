@@ -0,0 +1,65 @@
+import queue
+import threading
+from itertools import islice
+
+
+_DONE = object()
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of at most `size` items from any iterable, without materializing it.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Error:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(iterable, size):
+    """
+    Runs `iterable` in a background thread, staying at most `size` items ahead of the consumer.\n
+    Exceptions raised while producing are re-raised in the consumer.
+    """
+    buffer = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Error(e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Error):
+                raise item.error
+            yield item
+    finally:
+        # Lets the producer exit if the consumer stops early.
+        stop.set()
@@ -0,0 +1,192 @@
+import json
+import os
+from bisect import bisect_left
+from collections import Counter
+
+
+def _tokens(uris):
+    """
+    Makes every entry unique by pairing it with its occurrence count, so duplicate tracks can be told apart.
+    """
+    seen = Counter()
+    tokens = []
+    for uri in uris:
+        tokens.append((uri, seen[uri]))
+        seen[uri] += 1
+    return tokens
+
+
+def _is_fixed(uri) -> bool:
+    """
+    Checks if the playlist entry is one the API can't add, i.e. an unavailable track or a local file.
+    """
+    return uri is None or uri.startswith("spotify:local:")
+
+
+def _longest_increasing(values) -> set:
+    """
+    Returns the indices of a longest strictly increasing subsequence of `values`.
+    """
+    tails = []
+    tail_indices = []
+    previous = [-1] * len(values)
+    for idx, value in enumerate(values):
+        pos = bisect_left(tails, value)
+        if pos: previous[idx] = tail_indices[pos - 1]
+        if pos == len(tails):
+            tails.append(value)
+            tail_indices.append(idx)
+        else:
+            tails[pos] = value
+            tail_indices[pos] = idx
+    indices = set()
+    idx = tail_indices[-1] if tail_indices else -1
+    while idx >= 0:
+        indices.add(idx)
+        idx = previous[idx]
+    return indices
+
+
+def plan_sync(current: list, desired: list, batch_size=100) -> list:
+    """
+    Returns the edit script turning the playlist `current` into `desired`, both given as lists of track URIs.\n
+    The script is a list of JSON-serializable operations, applied in order:\n
+    - `{"op": "remove", "items": [{"uri": ..., "positions": [...]}]}` -> Removes specific occurrences.\n
+    - `{"op": "move", "range_start": ..., "insert_before": ..., "range_length": ...}` -> Moves a contiguous block of tracks.\n
+    - `{"op": "add", "uris": [...], "position": ...}` -> Inserts tracks at a position.\n
+    - `{"op": "replace", "uris": [...]}` -> Replaces every track of the playlist.\n
+    Only the tracks that aren't in the longest run already in the desired order are moved. If the edits would take more calls than
+    rewriting the whole playlist, the script rewrites it instead: it replaces the playlist with the first `batch_size` tracks and adds the rest.\n
+    Entries of `current` without a URI (unavailable tracks, local files) can't be edited through the API, so they are kept and moved to the end.
+    Playlists holding such entries are never replaced, since the replace would drop them. They are rewritten by removing every other entry
+    and adding `desired` in front of what's left.
+    """
+    desired = list(desired)
+    if any(_is_fixed(uri) for uri in current):
+        rewrite = _remove_ops([(position, uri) for position, uri in enumerate(current) if not _is_fixed(uri)], batch_size) + _add_ops(desired, 0, batch_size)
+    else:
+        rewrite = [{"op": "replace", "uris": desired[:batch_size]}] + _add_ops(desired[batch_size:], batch_size, batch_size)
+    ops = _edit_ops(current, desired, batch_size, limit=len(rewrite))
+    return rewrite if ops is None else ops
+
+
+def _edit_ops(current, desired, batch_size, limit=None):
+    """
+    Returns the remove, move and add operations turning `current` into `desired`, or None as soon as there are more than `limit` of them.
+    """
+    ops = []
+    wanted = Counter(desired)
+    removals = []
+    kept = []
+    for position, uri in enumerate(current):
+        if _is_fixed(uri):
+            kept.append(uri)
+        elif wanted[uri] > 0:
+            wanted[uri] -= 1
+            kept.append(uri)
+        else:
+            removals.append((position, uri))
+
+    ops.extend(_remove_ops(removals, batch_size))
+    if limit is not None and len(ops) > limit:
+        return None
+
+    # Reorder what is left into the order the desired playlist has it in.
+    available = Counter(uri for uri in kept if not _is_fixed(uri))
+    order = []
+    for uri in desired:
+        if available[uri] > 0:
+            available[uri] -= 1
+            order.append(uri)
+    order.extend(uri for uri in kept if _is_fixed(uri))
+    cur = _tokens(kept)
+    want = _tokens(order)
+    rank = {token: idx for idx, token in enumerate(want)}
+    # The longest run of tracks already in the desired order stays put, everything else is moved
+    # right behind the track it follows in `want`, in blocks where neighbours already are neighbours.
+    staying = {cur[idx] for idx in _longest_increasing([rank[token] for token in cur])}
+    idx = 0
+    while idx < len(want):
+        if want[idx] in staying:
+            idx += 1
+            continue
+        start = cur.index(want[idx])
+        length = 1
+        while idx + length < len(want) and start + length < len(cur) and cur[start + length] == want[idx + length]:
+            length += 1
+        insert_before = cur.index(want[idx - 1]) + 1 if idx else 0
+        if not start <= insert_before <= start + length:
+            ops.append({"op": "move", "range_start": start, "insert_before": insert_before, "range_length": length})
+            if limit is not None and len(ops) > limit:
+                return None
+            block = cur[start:start + length]
+            del cur[start:start + length]
+            if insert_before > start: insert_before -= length
+            cur[insert_before:insert_before] = block
+        idx += length
+
+    # Fill in the missing tracks, one insert per contiguous run.
+    seen = Counter(uri for uri, _ in cur)
+    run = []
+    for position, uri in enumerate(desired):
+        if seen[uri] > 0:
+            seen[uri] -= 1
+            if run:
+                ops.extend(_add_ops(run, position - len(run), batch_size))
+                run = []
+            continue
+        run.append(uri)
+    if run:
+        ops.extend(_add_ops(run, len(desired) - len(run), batch_size))
+    if limit is not None and len(ops) > limit:
+        return None
+    return ops
+
+
+def _remove_ops(removals, batch_size):
+    """
+    Returns the operations removing the given `(position, uri)` entries, at most `batch_size` different tracks at a time.
+    """
+    ops = []
+    batch = {}
+    # Removing from the end first keeps the positions of every later batch valid.
+    for position, uri in sorted(removals, reverse=True):
+        if uri not in batch and len(batch) == batch_size:
+            ops.append({"op": "remove", "items": [{"uri": uri, "positions": positions} for uri, positions in batch.items()]})
+            batch = {}
+        batch.setdefault(uri, []).append(position)
+    if batch:
+        ops.append({"op": "remove", "items": [{"uri": uri, "positions": positions} for uri, positions in batch.items()]})
+    return ops
+
+
+def _add_ops(uris, position, batch_size):
+    return [{"op": "add", "uris": uris[idx:idx+batch_size], "position": position + idx} for idx in range(0, len(uris), batch_size)]
+
+
+class SyncCheckpoint:
+    """
+    Keeps the edit script of a sync and how far it got in a JSON file, so an interrupted sync can resume.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, source, target):
+        if not self.path or not os.path.isfile(self.path):
+            return None
+        with open(self.path, "r") as file:
+            state = json.load(file)
+        if state["source"] != source or state["target"] != target:
+            return None
+        return state
+
+    def save(self, state):
+        if not self.path: return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(state, file)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.isfile(self.path):
+            os.remove(self.path)
@@ -1,4 +1,5 @@
 from contextlib import suppress
+import importlib
 import importlib.metadata
 from pathlib import Path
 from SpotifyUtil.SpotifyUtil import SpotifyUtil
@@ -9,7 +10,7 @@ def extract_version() -> str:
     """Returns either the version of installed package or the one
     found in nearby pyproject.toml"""
     with suppress(FileNotFoundError, StopIteration):
-        with open((root_dir := Path(__file__).parent.parent)
+        with open((root_dir := Path(__file__).parent)
                 / "pyproject.toml", encoding="utf-8") as pyproject_toml:
             version = (
                 next(line for line in pyproject_toml if line.startswith("version"))
@@ -21,7 +22,16 @@ def extract_version() -> str:
 
 __version__ = extract_version()
 
+
+def __getattr__(name):
+    # Imported on first access, like in the `SpotifyUtil` package.
+    if name == "AsyncSpotifyUtil":
+        value = globals()[name] = importlib.import_module("SpotifyUtil.AsyncSpotifyUtil").AsyncSpotifyUtil
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __all__ = [
     "Config",
     "SpotifyUtil",
+    "AsyncSpotifyUtil",
 ]
\ No newline at end of file
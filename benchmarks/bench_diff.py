@@ -0,0 +1,144 @@
+"""
+Benchmarks `PlaylistDiff` over many large playlists: interning, building the bitsets, and every operation.
+
+    python -m benchmarks.bench_diff
+    python -m benchmarks.bench_diff --playlists 20 --size 10000 --overlap 0.1 --repeat 5
+
+The playlists draw their tracks from a shared pool, so they overlap, and repeat a few tracks each.
+Every operation is timed next to the same result computed with Python sets, keeping the order of first appearance.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from SpotifyUtil.diff import PlaylistDiff, _to_bitset
+
+
+def playlists(count, size, overlap=0.1, duplicates=0.01, seed=0) -> list:
+    """
+    Returns `count` lists of `size` track URIs. The smaller `overlap`, the larger the pool they are drawn from.
+    """
+    rng = random.Random(seed)
+    pool = [f"spotify:track:{idx:022d}" for idx in range(int(size / max(overlap, 1 / count)))]
+    lists = []
+    for _ in range(count):
+        tracks = rng.sample(pool, size)
+        for idx in rng.sample(range(size), int(size * duplicates)):
+            tracks[idx] = tracks[rng.randrange(size)]
+        lists.append(tracks)
+    return lists
+
+
+def _ordered(tracks, keep) -> list:
+    seen = set()
+    result = []
+    for track in tracks:
+        if track in keep and track not in seen:
+            seen.add(track)
+            result.append(track)
+    return result
+
+
+def _set_union(lists):
+    return _ordered((track for tracks in lists for track in tracks), set().union(*lists))
+
+
+def _set_intersection(lists):
+    return _ordered(lists[0], set(lists[0]).intersection(*lists[1:]))
+
+
+def _set_difference(lists):
+    return _ordered(lists[0], set(lists[0]).difference(*lists[1:]))
+
+
+def _set_missing(lists):
+    return _ordered((track for tracks in lists[1:] for track in tracks), set().union(*lists[1:]).difference(lists[0]))
+
+
+def _set_duplicates(lists):
+    seen, duplicated = set(), set()
+    for tracks in lists:
+        tracks = set(tracks)
+        duplicated |= seen & tracks
+        seen |= tracks
+    return _ordered((track for tracks in lists for track in tracks), duplicated)
+
+
+def _set_repeated(lists):
+    result = []
+    counts = {}
+    for track in lists[0]:
+        counts[track] = counts.get(track, 0) + 1
+        if counts[track] == 2:
+            result.append(track)
+    return result
+
+
+# Operation -> (PlaylistDiff call, the same with sets).
+OPERATIONS = {
+    "union": (lambda diff: diff.union(), _set_union),
+    "intersection": (lambda diff: diff.intersection(), _set_intersection),
+    "difference": (lambda diff: diff.difference(0), _set_difference),
+    "missing": (lambda diff: diff.missing(0), _set_missing),
+    "duplicates": (lambda diff: diff.duplicates(), _set_duplicates),
+    "repeated": (lambda diff: diff.repeated(0), _set_repeated),
+}
+
+
+def _time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def benchmark(count=20, size=10000, overlap=0.1, repeat=5) -> list:
+    """
+    Returns the median time in seconds of interning, building the bitsets and every operation, along with their set-based equivalents.
+    """
+    lists = playlists(count, size, overlap=overlap)
+    results = []
+
+    def report(name, elapsed, reference=None, items=None):
+        results.append({"step": name, "seconds": elapsed, "sets_seconds": reference, "items": items})
+        reference = f"{reference * 1000:>12.1f}" if reference is not None else f"{'':>12}"
+        items = f"{items:>10}" if items is not None else ""
+        print(f"{name:<14}{elapsed * 1000:>12.1f}{reference}{items}", flush=True)
+
+    def intern():
+        diff = PlaylistDiff()
+        diff.lists = [diff._intern(tracks) for tracks in lists]
+        return diff
+    elapsed, diff = _time(intern, repeat)
+    report("intern", elapsed)
+    elapsed, diff.bitsets = _time(lambda: [_to_bitset(interned, len(diff.tracks)) for interned in diff.lists], repeat)
+    report("bitsets", elapsed)
+    for name, (operation, with_sets) in OPERATIONS.items():
+        elapsed, result = _time(lambda: operation(diff), repeat)
+        reference, expected = _time(lambda: with_sets(lists), repeat)
+        assert result == expected, name
+        report(name, elapsed, reference, len(result))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--playlists", type=int, default=20)
+    parser.add_argument("--size", type=int, default=10000, help="Tracks per playlist.")
+    parser.add_argument("--overlap", type=float, default=0.1, help="Playlist size over the size of the pool the tracks are drawn from.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per step, the median is reported.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args(argv)
+
+    print(f"{'step':<14}{'diff (ms)':>12}{'sets (ms)':>12}{'items':>10}")
+    results = benchmark(args.playlists, args.size, overlap=args.overlap, repeat=args.repeat)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmarks the public operations of `SpotifyUtil` against the fake backend, reporting API calls, wall time and peak memory of each.
+
+    python -m benchmarks.bench_operations --sizes 100 1000 10000 50000
+    python -m benchmarks.bench_operations --mode http --latency 0.02 --throttle-every 25 --json results.json
+
+Every operation runs twice on a fresh library and client, so caches start cold: once for the API calls and the wall time,
+and once under tracemalloc for the peak memory, since tracing slows everything down. In-process, the memory includes the
+responses built by the fake backend, standing in for the JSON spotipy would have parsed.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from SpotifyUtil import SpotifyUtil
+from SpotifyUtil.scheduler import RequestScheduler
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotify, FakeSpotifyServer, StaticToken
+
+
+def playlist_url(playlist_id):
+    return f"https://open.spotify.com/playlist/{playlist_id}"
+
+
+def _album_items(sp, backend, options):
+    # Simplified track objects, like album pages hold, so every track has to be fetched in full.
+    return [{"id": track_id, "uri": f"spotify:track:{track_id}"} for track_id in backend.library.playlists["source"]["items"]]
+
+
+def _shuffled_target(sp, backend, options):
+    # A target sharing most of the source, with some tracks missing, some extra and some moved.
+    items = list(backend.library.playlists["source"]["items"])
+    rng = random.Random(len(items))
+    del items[::7]
+    for _ in range(len(items) // 20):
+        idx = rng.randrange(len(items))
+        items.insert(rng.randrange(len(items) + 1), items.pop(idx))
+    backend.library.playlists["target"]["items"] = items
+
+
+def _lines(sp, backend, options):
+    return [f"Song {idx} - Artist {idx % 997}" for idx in range(min(options["search_limit"], backend.library.size))]
+
+
+def _songs_file(sp, backend, options):
+    # The directory is removed once the state is dropped.
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, "songs.txt")
+    with open(path, "w") as file:
+        file.write("\n".join(_lines(sp, backend, options)))
+    return directory, path
+
+
+# Operation name -> (setup(sp, backend, options) returning extra state or None, run(sp, backend, state)).
+OPERATIONS = {
+    "get_tracks": (None, lambda sp, backend, state: sp.get_tracks(playlist_url("source"))),
+    "iter_tracks": (None, lambda sp, backend, state: sum(1 for _ in sp.iter_tracks(playlist_url("source")))),
+    "get_tracks_parallel": (None, lambda sp, backend, state: sp.get_tracks(playlist_url("source"))),
+    "get_liked_songs": (None, lambda sp, backend, state: sp.get_liked_songs(limit=50, offset=0)),
+    "distribute_tracks": (_album_items, lambda sp, backend, state: sp.distribute_tracks(state, avoid_unavailable=True)),
+    "get_different_tracks": (None, lambda sp, backend, state: sp.get_different_tracks(playlist_url("source"), playlist_url("target"))),
+    "get_unplayable_songs_from_playlist": (None, lambda sp, backend, state: sp.get_unplayable_songs_from_playlist(playlist_url("source"))),
+    "add_songs_to_playlist": (None, lambda sp, backend, state: sp.add_songs_to_playlist(playlist_url=playlist_url("target"), from_url=playlist_url("source"))),
+    "add_songs_to_playlist_new": (None, lambda sp, backend, state: sp.add_songs_to_playlist(from_url=playlist_url("source"), name="Copy")),
+    "add_liked_songs_to_playlist": (None, lambda sp, backend, state: sp.add_liked_songs_to_playlist(name="Liked", limit=50, offset=0)),
+    "create_unplayable_track_playlist": (None, lambda sp, backend, state: sp.create_unplayable_track_playlist("Unplayable", playlist_url("source"))),
+    "clear_playlist": (None, lambda sp, backend, state: sp.clear_playlist(playlist_url("target"))),
+    "add_songs_to_playlist_from_file": (_songs_file, lambda sp, backend, state: sp.add_songs_to_playlist_from_file(state[1], name="From file")),
+    "sync_playlist": (_shuffled_target, lambda sp, backend, state: sp.sync_playlist(playlist_url("source"), playlist_url("target"))),
+    "get_track_IDs_from_names": (_lines, lambda sp, backend, state: sp.get_track_IDs_from_names(state)),
+}
+
+
+class Environment:
+    """
+    A fresh library, backend and `SpotifyUtil` talking to it, in-process or over a localhost server.
+    """
+    def __init__(self, size, mode="inprocess", latency=0.0, throttle_every=0, rate=None, parallel_pages=False):
+        self.backend = FakeBackend(SyntheticLibrary(size), latency=latency, throttle_every=throttle_every)
+        self.server = None
+        scheduler = RequestScheduler(rate=rate, backoff_base=0.01)
+        kwargs = dict(scheduler=scheduler, parallel_pages=parallel_pages)
+        if mode == "http":
+            self.server = FakeSpotifyServer(self.backend).start()
+            self.sp = SpotifyUtil(auth_manager=StaticToken(), api_base=self.server.base_url, **kwargs)
+        else:
+            self.sp = SpotifyUtil(client=FakeSpotify(self.backend), **kwargs)
+        self.backend.reset_calls()
+
+    def close(self):
+        if self.server is not None:
+            self.server.stop()
+
+
+def _run(name, size, options, trace=False):
+    setup, run = OPERATIONS[name]
+    env = Environment(size, parallel_pages=name.endswith("_parallel"), **options["env"])
+    try:
+        state = setup(env.sp, env.backend, options) if setup else None
+        env.backend.reset_calls()
+        if trace:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        run(env.sp, env.backend, state)
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1] - before
+            tracemalloc.stop()
+        return {"calls": env.backend.total_calls(), "retries": env.sp.scheduler.get_stats()["retries"], "wall": elapsed, "peak": peak, "by_route": dict(env.backend.calls)}
+    finally:
+        env.close()
+
+
+def benchmark(operations, sizes, mode="inprocess", latency=0.0, throttle_every=0, rate=None, search_limit=1000, memory=True) -> list:
+    """
+    Returns a result per operation and library size with its API calls (429s included), retries, wall time in seconds and peak memory in bytes.
+    """
+    options = {"env": dict(mode=mode, latency=latency, throttle_every=throttle_every, rate=rate), "search_limit": search_limit}
+    results = []
+    for size in sizes:
+        for name in operations:
+            result = _run(name, size, options)
+            if memory:
+                result["peak"] = _run(name, size, options, trace=True)["peak"]
+            results.append({"operation": name, "size": size, **result})
+            print(f"{name:<36}{size:>8}{result['calls']:>8}{result['retries']:>8}{result['wall']:>10.3f}{result['peak'] / 2**20:>10.2f}", flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--operations", nargs="+", default=list(OPERATIONS), choices=list(OPERATIONS))
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every fake request takes.")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every n-th request with a 429.")
+    parser.add_argument("--rate", type=float, default=None, help="Scheduler rate limit in calls per second. Unlimited by default.")
+    parser.add_argument("--search-limit", type=int, default=1000, help="Max. no. of lines resolved by get_track_IDs_from_names and add_songs_to_playlist_from_file.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc runs.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args(argv)
+    # spotipy logs every injected 429 as an error.
+    logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+    print(f"{'operation':<36}{'tracks':>8}{'calls':>8}{'retries':>8}{'wall (s)':>10}{'peak (MB)':>10}")
+    results = benchmark(args.operations, args.sizes, mode=args.mode, latency=args.latency, throttle_every=args.throttle_every,
+                        rate=args.rate, search_limit=args.search_limit, memory=not args.no_memory)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmarks the memory of N tracks held as the old track detail dicts, as `TrackRecord`s and as a `TrackSetDetails`.
+
+    python -m benchmarks.bench_records --sizes 1000 10000 50000
+    python -m benchmarks.bench_records --markets 180
+
+Every representation is built in its own tracemalloc session from the same JSON text, parsed page by page like API responses.
+`retained` is what is still allocated once the parsed JSON is dropped, `peak` the most allocated at any point while building.
+The old dicts keep the whole parsed track under "track", so for them the JSON is never dropped.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from itertools import product
+from string import ascii_uppercase
+from SpotifyUtil.base import SpotifyUtilBase
+from SpotifyUtil import records
+from SpotifyUtil.records import TrackRecord, TrackSetDetails
+from benchmarks.fake_spotify import SyntheticLibrary
+
+
+def _pages(size, markets, page_size=100) -> list:
+    """
+    Returns the tracks of a synthetic library as JSON texts of `page_size` tracks each.
+    """
+    library = SyntheticLibrary(size, markets=markets) if markets else SyntheticLibrary(size)
+    ids = [library.track_id(idx) for idx in range(size)]
+    return [json.dumps([library.track(track_id) for track_id in ids[idx:idx + page_size]]) for idx in range(0, size, page_size)]
+
+
+def _as_dicts(pages):
+    # The shape `_build_track_details` returned before `TrackRecord`.
+    return [
+        {"track": song, "name": song['name'], "artist": song['album']['artists'][0]['name'], "uri": song['uri'], "playable": SpotifyUtilBase._is_playable(song)}
+        for page in pages for song in json.loads(page)
+    ]
+
+
+def _as_records(pages):
+    return [TrackRecord.from_json(song, playable=SpotifyUtilBase._is_playable(song)) for page in pages for song in json.loads(page)]
+
+
+def _as_track_set(pages):
+    # Filled page by page, so that no more than a page of records exists at once.
+    unplayable = []
+    track_set = TrackSetDetails(total_size=0, playable_size=0, detailed_list=[], unplayable_list=unplayable)
+    for page in pages:
+        for song in json.loads(page):
+            record = TrackRecord.from_json(song, playable=SpotifyUtilBase._is_playable(song))
+            track_set.append(record)
+            if not record.playable: unplayable.append(record.uri)
+    track_set.total_size = len(track_set)
+    track_set.playable_size = len(track_set) - len(unplayable)
+    return track_set
+
+
+REPRESENTATIONS = {
+    "dicts": _as_dicts,
+    "records": _as_records,
+    "track_set": _as_track_set,
+}
+
+
+def _measure(build, pages) -> dict:
+    # Every representation pays for its own interned market sets.
+    records._MARKETS.clear()
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = build(pages)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"retained": retained - before, "peak": peak - before, "build": elapsed}
+
+
+def benchmark(sizes, markets=None) -> list:
+    """
+    Returns the retained and peak bytes and the build time in seconds of every representation per no. of tracks.
+    """
+    results = []
+    for size in sizes:
+        pages = _pages(size, markets)
+        for name, build in REPRESENTATIONS.items():
+            result = {"representation": name, "size": size, **_measure(build, pages)}
+            results.append(result)
+            print(f"{name:<12}{size:>8}{result['retained'] / 2**20:>14.2f}{result['peak'] / 2**20:>12.2f}{result['retained'] / size:>14.0f}{result['build']:>10.3f}", flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--markets", type=int, default=None, help="No. of markets every playable track is available in. The fake library's 15 by default, real tracks often have close to 180.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args(argv)
+    markets = None
+    if args.markets:
+        markets = ["".join(code) for code in product(ascii_uppercase, repeat=2)][:args.markets]
+
+    print(f"{'shape':<12}{'tracks':>8}{'retained (MB)':>14}{'peak (MB)':>12}{'bytes/track':>14}{'build (s)':>10}")
+    results = benchmark(args.sizes, markets=markets)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmarks how long scripts using `SpotifyUtil` take to start: importing the package, creating a client, and making the first call.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 20 --importtime
+
+Every run is a fresh interpreter, so nothing is imported yet, talking to a `FakeSpotifyServer` started by this process.
+The client is created once eagerly and once with `lazy=True`, where the token and the current user are only fetched when needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotifyServer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from SpotifyUtil import SpotifyUtil
+imported = time.perf_counter()
+class StaticToken:
+    # Like `benchmarks.fake_spotify.StaticToken`, which would import spotipy before the client does.
+    def get_access_token(self, *args, **kwargs): return {"access_token": "fake-token"}
+sp = SpotifyUtil(auth_manager=StaticToken(), api_base=sys.argv[1], lazy=sys.argv[2] == "lazy")
+constructed = time.perf_counter()
+sp.get_playlist_name_from_id("source")
+called = time.perf_counter()
+json.dump({"import": imported - start, "construct": constructed - imported, "first_call": called - constructed,
+           "modules": sorted(name for name in ("spotipy", "requests", "redis", "asyncio", "sqlite3", "cProfile") if name in sys.modules)}, sys.stdout)
+"""
+
+
+def _run(base_url, mode) -> dict:
+    output = subprocess.run([sys.executable, "-c", _SCRIPT, base_url, mode], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def import_time() -> str:
+    """
+    Returns the `-X importtime` report of `import SpotifyUtil`, slowest imports last.
+    """
+    report = subprocess.run([sys.executable, "-X", "importtime", "-c", "import SpotifyUtil"], cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    lines = [line for line in report.splitlines() if line.startswith("import time:") and "|" in line]
+    return "\n".join(sorted(lines[1:], key=lambda line: int(line.split("|")[1]))[-15:])
+
+
+def benchmark(repeat=10) -> list:
+    """
+    Returns the median import, construction and first call times in seconds of eager and lazy clients,
+    along with the API calls made per run and the heavy modules imported by the end of it.
+    """
+    backend = FakeBackend(SyntheticLibrary(100))
+    results = []
+    with FakeSpotifyServer(backend) as server:
+        for mode in ("eager", "lazy"):
+            backend.reset_calls()
+            runs = [_run(server.base_url, mode) for _ in range(repeat)]
+            result = {"mode": mode, "calls": backend.total_calls() // repeat, "modules": runs[-1]["modules"]}
+            for phase in ("import", "construct", "first_call"):
+                result[phase] = statistics.median(run[phase] for run in runs)
+            results.append(result)
+            print(f"{mode:<8}{result['import'] * 1000:>14.1f}{result['construct'] * 1000:>16.1f}{result['first_call'] * 1000:>18.1f}{result['calls']:>8}  {', '.join(result['modules'])}", flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="Fresh interpreters per mode.")
+    parser.add_argument("--importtime", action="store_true", help="Also print the slowest imports of the package.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':<8}{'import (ms)':>14}{'construct (ms)':>16}{'first call (ms)':>18}{'calls':>8}  modules")
+    results = benchmark(repeat=args.repeat)
+    if args.importtime:
+        print(import_time())
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+A fake Spotify Web API for offline benchmarks.
+
+`FakeBackend` answers Web API requests from a `SyntheticLibrary`, with pagination, optional latency and injected 429s.
+It can be used in-process through `FakeSpotify`, a `spotipy.Spotify` that skips HTTP entirely,
+or over HTTP through `FakeSpotifyServer`, e.g. for `AsyncSpotifyUtil` or to include the networking stack in a run.
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+from spotipy import Spotify
+from spotipy.exceptions import SpotifyException
+
+
+MARKETS = ("US", "GB", "IN", "DE", "FR", "BR", "JP", "CA", "AU", "MX", "ES", "IT", "NL", "SE", "KR")
+USER_ID = "benchmark-user"
+
+
+class SyntheticLibrary:
+    """
+    The tracks, playlists, albums and liked songs served by a `FakeBackend`.\n
+    Synthetic tracks are generated from their index when requested, so a library of 50k tracks costs little more than its playlists.
+    Tracks recorded from the real API (see `record`) are kept in `tracks` and served as they are.\n
+    Params:\n
+    - `size` -> No. of synthetic tracks. Track `i` is named "Song i" by "Artist i % 997".\n
+    - `unplayable_every` -> Every n-th track is available in no market. Set to 0 to make all of them playable.\n
+    - `playlists` -> Playlist ID to track IDs. Defaults to "source" holding every track and "target" holding every other one.\n
+    - `liked` -> Track IDs of the liked songs. Defaults to every track.
+    """
+    def __init__(self, size=1000, unplayable_every=10, markets=MARKETS, playlists=None, liked=None, albums=None, tracks=None):
+        self.size = size
+        self.unplayable_every = unplayable_every
+        self.markets = tuple(markets)
+        self.tracks = tracks or {}
+        ids = [self.track_id(idx) for idx in range(size)]
+        if playlists is None:
+            playlists = {"source": ids, "target": ids[::2]}
+        self.playlists = {}
+        for playlist_id, items in playlists.items():
+            self.add_playlist(playlist_id, items)
+        self.liked = list(ids if liked is None else liked)
+        self.albums = albums if albums is not None else {"album": ids[:20]}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def track_id(idx: int) -> str:
+        return f"{idx:022d}"
+
+    def add_playlist(self, playlist_id, items, name=None):
+        self.playlists[playlist_id] = {"name": name or playlist_id, "items": list(items), "snapshot": 0}
+
+    def _index(self, track_id):
+        if len(track_id) == 22 and track_id.isdigit():
+            idx = int(track_id)
+            if idx < self.size:
+                return idx
+        return None
+
+    def _markets(self, idx):
+        if self.unplayable_every and idx % self.unplayable_every == self.unplayable_every - 1:
+            return []
+        return list(self.markets)
+
+    def track(self, track_id, market=None, simplified=False):
+        """
+        Returns the track JSON, or None if there's no such track. With a `market`, `is_playable` replaces `available_markets`, like the real API.
+        """
+        if track_id in self.tracks:
+            track = json.loads(json.dumps(self.tracks[track_id]))
+        else:
+            idx = self._index(track_id)
+            if idx is None:
+                return None
+            artist = {"id": f"{idx % 997:022d}", "name": f"Artist {idx % 997}", "type": "artist", "uri": f"spotify:artist:{idx % 997:022d}"}
+            track = {
+                "id": track_id,
+                "name": f"Song {idx}",
+                "type": "track",
+                "uri": f"spotify:track:{track_id}",
+                "href": f"https://api.spotify.com/v1/tracks/{track_id}",
+                "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+                "external_ids": {"isrc": f"QZ{idx:010d}"},
+                "artists": [artist],
+                "album": {"id": f"{idx // 12:022d}", "name": f"Album {idx // 12}", "type": "album", "artists": [artist], "release_date": "2020-01-01"},
+                "available_markets": self._markets(idx),
+                "duration_ms": 120000 + idx % 180000,
+                "explicit": False,
+                "popularity": idx % 100,
+                "track_number": idx % 12 + 1,
+                "disc_number": 1,
+                "is_local": False,
+            }
+        if market is not None:
+            track["is_playable"] = market in track.pop("available_markets", [])
+        if simplified:
+            track.pop("album", None)
+            track.pop("external_ids", None)
+            track.pop("popularity", None)
+        return track
+
+    def search(self, query, limit=10) -> list:
+        """
+        Returns the IDs matching `query`. Synthetic tracks are found by the number of "Song i", recorded ones by their name.
+        """
+        match = re.search(r"song (\d+)", query, re.IGNORECASE)
+        if match and int(match.group(1)) < self.size:
+            idx = int(match.group(1))
+            # The exact track first, followed by near misses, like a real search would.
+            return [self.track_id(other) for other in range(idx, min(self.size, idx + limit))]
+        query = query.lower()
+        return [track_id for track_id, track in self.tracks.items() if track.get("name", "").lower() in query][:limit]
+
+    def to_fixture(self) -> dict:
+        return {
+            "size": self.size,
+            "unplayable_every": self.unplayable_every,
+            "markets": list(self.markets),
+            "playlists": {playlist_id: playlist["items"] for playlist_id, playlist in self.playlists.items()},
+            "liked": self.liked,
+            "albums": self.albums,
+            "tracks": self.tracks,
+        }
+
+    def save(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_fixture(), file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as file:
+            return cls(**json.load(file))
+
+    @classmethod
+    def record(cls, client, playlist_ids=(), liked=False):
+        """
+        Records the given playlists (and the liked songs if `liked` is set) of a real `spotipy.Spotify` client into a library without synthetic tracks.
+        Save it with `save` to replay the responses offline.
+        """
+        library = cls(size=0, playlists={}, liked=[], albums={})
+
+        def collect(results):
+            ids = []
+            while True:
+                for item in results["items"]:
+                    track = item.get("track")
+                    if track and track.get("id"):
+                        library.tracks[track["id"]] = track
+                        ids.append(track["id"])
+                if not results["next"]:
+                    return ids
+                results = client.next(results)
+
+        for playlist_id in playlist_ids:
+            library.add_playlist(playlist_id, collect(client.playlist_items(playlist_id)))
+        if liked:
+            library.liked = collect(client.current_user_saved_tracks(limit=50))
+        return library
+
+
+class FakeBackend:
+    """
+    Answers Spotify Web API requests from a `SyntheticLibrary`.\n
+    Params:\n
+    - `latency` -> Seconds every request takes.\n
+    - `throttle_every` -> Every n-th request gets a 429 with a `Retry-After` of `retry_after` seconds. Set to 0 to never throttle.\n
+    Every request is counted in `calls` by method and route, e.g. `"GET playlists/{id}/tracks"`, throttled ones included.
+    """
+    ROUTES = (
+        ("GET", r"me", "_me"),
+        ("GET", r"me/tracks", "_liked"),
+        ("GET", r"tracks", "_tracks"),
+        ("GET", r"tracks/(?P<id>[^/]+)", "_track"),
+        ("GET", r"playlists/(?P<id>[^/]+)", "_playlist"),
+        ("GET", r"playlists/(?P<id>[^/]+)/tracks", "_playlist_tracks"),
+        ("POST", r"playlists/(?P<id>[^/]+)/tracks", "_add"),
+        ("DELETE", r"playlists/(?P<id>[^/]+)/tracks", "_remove"),
+        ("PUT", r"playlists/(?P<id>[^/]+)/tracks", "_reorder"),
+        # Newer spotipy releases use the /items endpoints.
+        ("GET", r"playlists/(?P<id>[^/]+)/items", "_playlist_tracks"),
+        ("POST", r"playlists/(?P<id>[^/]+)/items", "_add"),
+        ("DELETE", r"playlists/(?P<id>[^/]+)/items", "_remove"),
+        ("PUT", r"playlists/(?P<id>[^/]+)/items", "_reorder"),
+        ("POST", r"users/(?P<id>[^/]+)/playlists", "_create"),
+        ("GET", r"albums/(?P<id>[^/]+)", "_album"),
+        ("GET", r"albums/(?P<id>[^/]+)/tracks", "_album_tracks"),
+        ("GET", r"search", "_search"),
+    )
+
+    def __init__(self, library=None, latency=0.0, throttle_every=0, retry_after=0.01):
+        self.library = library if library is not None else SyntheticLibrary()
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self._requests = 0
+        self._lock = threading.Lock()
+        self._routes = [(method, re.compile(pattern + "/?$"), handler, pattern) for method, pattern, handler in self.ROUTES]
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def handle(self, method, url, params=None, payload=None):
+        """
+        Returns the `(status, headers, body)` of the request. `url` is a full API url, e.g. `https://api.spotify.com/v1/me`.
+        """
+        parts = urlsplit(url)
+        base, _, path = parts.path.partition("/v1/")
+        base = f"{parts.scheme}://{parts.netloc}{base}/v1/"
+        params = {**dict(parse_qsl(parts.query)), **{key: value for key, value in (params or {}).items() if value is not None}}
+        for route_method, pattern, handler, name in self._routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                break
+        else:
+            return 404, {}, {"error": {"status": 404, "message": f"No route for {method} {path}"}}
+        route = f"{method} " + re.sub(r"\(\?P<(\w+)>[^)]*\)", r"{\1}", name)
+        with self._lock:
+            self.calls[route] += 1
+            self._requests += 1
+            throttled = self.throttle_every and self._requests % self.throttle_every == 0
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            return 429, {"Retry-After": str(self.retry_after)}, {"error": {"status": 429, "message": "API rate limit exceeded"}}
+        try:
+            return getattr(self, handler)(base, params, payload, **match.groupdict())
+        except KeyError as e:
+            return 404, {}, {"error": {"status": 404, "message": f"Not found: {e}"}}
+        except ValueError as e:
+            return 400, {}, {"error": {"status": 400, "message": str(e)}}
+
+    @staticmethod
+    def _limit(params, default, maximum):
+        limit = int(params.get("limit", default))
+        if not 0 < limit <= maximum:
+            raise ValueError(f"Invalid limit: {limit}")
+        return limit, int(params.get("offset", 0))
+
+    def _page(self, base, path, ids, params, default, maximum, market=None, simplified=False, wrap=True):
+        limit, offset = self._limit(params, default, maximum)
+        items = []
+        for track_id in ids[offset:offset + limit]:
+            track = self.library.track(track_id, market=market, simplified=simplified)
+            items.append({"added_at": "2020-01-01T00:00:00Z", "is_local": False, "track": track} if wrap else track)
+        extra = f"&market={market}" if market else ""
+        url = f"{base}{path}?offset={{}}&limit={limit}{extra}"
+        return {
+            "href": url.format(offset),
+            "items": items,
+            "limit": limit,
+            "offset": offset,
+            "total": len(ids),
+            "next": url.format(offset + limit) if offset + limit < len(ids) else None,
+            "previous": url.format(max(0, offset - limit)) if offset else None,
+        }
+
+    def _me(self, base, params, payload):
+        return 200, {}, {"id": USER_ID, "display_name": "Benchmark User", "type": "user", "country": self.library.markets[0]}
+
+    def _liked(self, base, params, payload):
+        return 200, {}, self._page(base, "me/tracks", self.library.liked, params, 20, 50, market=params.get("market"))
+
+    def _tracks(self, base, params, payload):
+        ids = params["ids"].split(",")
+        if len(ids) > 50:
+            raise ValueError("Too many ids requested")
+        return 200, {}, {"tracks": [self.library.track(track_id, market=params.get("market")) for track_id in ids]}
+
+    def _track(self, base, params, payload, id):
+        track = self.library.track(id, market=params.get("market"))
+        if track is None:
+            raise KeyError(id)
+        return 200, {}, track
+
+    def _playlist(self, base, params, payload, id):
+        playlist = self.library.playlists[id]
+        body = {
+            "id": id,
+            "name": playlist["name"],
+            "type": "playlist",
+            "owner": {"id": USER_ID},
+            "snapshot_id": f"{id}-{playlist['snapshot']}",
+            "tracks": self._page(base, f"playlists/{id}/tracks", playlist["items"], {"limit": 100}, 100, 100, market=params.get("market")),
+        }
+        if params.get("fields"):
+            fields = [field.split("(")[0] for field in params["fields"].split(",")]
+            body = {field: body[field] for field in fields if field in body}
+        return 200, {}, body
+
+    def _playlist_tracks(self, base, params, payload, id):
+        return 200, {}, self._page(base, f"playlists/{id}/tracks", self.library.playlists[id]["items"], params, 100, 100, market=params.get("market"))
+
+    def _changed(self, playlist_id):
+        playlist = self.library.playlists[playlist_id]
+        playlist["snapshot"] += 1
+        return {"snapshot_id": f"{playlist_id}-{playlist['snapshot']}"}
+
+    def _add(self, base, params, payload, id):
+        uris = payload["uris"] if isinstance(payload, dict) else payload
+        if len(uris) > 100:
+            raise ValueError("You can add a maximum of 100 tracks per request.")
+        position = (payload.get("position") if isinstance(payload, dict) else None) or params.get("position")
+        with self.library._lock:
+            items = self.library.playlists[id]["items"]
+            ids = [uri.split(":")[-1] for uri in uris]
+            if position is None:
+                items.extend(ids)
+            else:
+                items[int(position):int(position)] = ids
+            return 201, {}, self._changed(id)
+
+    def _remove(self, base, params, payload, id):
+        # The /items endpoints name the list "items", the older /tracks ones "tracks".
+        tracks = payload["items"] if "items" in payload else payload["tracks"]
+        if len(tracks) > 100:
+            raise ValueError("You can remove a maximum of 100 tracks per request.")
+        with self.library._lock:
+            items = self.library.playlists[id]["items"]
+            everywhere = {track["uri"].split(":")[-1] for track in tracks if "positions" not in track}
+            positions = {position for track in tracks for position in track.get("positions", ())}
+            for track in tracks:
+                for position in track.get("positions", ()):
+                    if items[position] != track["uri"].split(":")[-1]:
+                        raise ValueError(f"Track at position {position} isn't {track['uri']}")
+            self.library.playlists[id]["items"] = [track_id for idx, track_id in enumerate(items) if idx not in positions and track_id not in everywhere]
+            return 200, {}, self._changed(id)
+
+    def _reorder(self, base, params, payload, id):
+        with self.library._lock:
+            playlist = self.library.playlists[id]
+            if "uris" in payload:
+                playlist["items"] = [uri.split(":")[-1] for uri in payload["uris"]]
+                return 200, {}, self._changed(id)
+            start, length, before = payload["range_start"], payload.get("range_length", 1), payload["insert_before"]
+            items = playlist["items"]
+            block = items[start:start + length]
+            rest = items[:start] + items[start + length:]
+            before = before if before <= start else before - length
+            playlist["items"] = rest[:before] + block + rest[before:]
+            return 200, {}, self._changed(id)
+
+    def _create(self, base, params, payload, id):
+        with self.library._lock:
+            playlist_id = f"created{len(self.library.playlists):015d}"
+            self.library.add_playlist(playlist_id, [], name=payload.get("name"))
+        return 201, {}, {
+            "id": playlist_id,
+            "name": payload.get("name"),
+            "type": "playlist",
+            "owner": {"id": id},
+            "uri": f"spotify:playlist:{playlist_id}",
+            "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"},
+            "snapshot_id": f"{playlist_id}-0",
+        }
+
+    def _album(self, base, params, payload, id):
+        ids = self.library.albums[id]
+        tracks = self._page(base, f"albums/{id}/tracks", ids, {"limit": 50}, 50, 50, market=params.get("market"), simplified=True, wrap=False)
+        return 200, {}, {"id": id, "name": id, "type": "album", "tracks": tracks}
+
+    def _album_tracks(self, base, params, payload, id):
+        return 200, {}, self._page(base, f"albums/{id}/tracks", self.library.albums[id], params, 20, 50, market=params.get("market"), simplified=True, wrap=False)
+
+    def _search(self, base, params, payload):
+        limit, offset = self._limit(params, 10, 50)
+        ids = self.library.search(params["q"], limit=limit)
+        items = [self.library.track(track_id, market=params.get("market")) for track_id in ids]
+        return 200, {}, {"tracks": {"href": f"{base}search", "items": items, "limit": limit, "offset": offset, "total": len(items), "next": None, "previous": None}}
+
+
+class FakeSpotify(Spotify):
+    """
+    A `spotipy.Spotify` whose requests are answered by `backend` in-process. Parameters are built by spotipy as usual, only the HTTP round trip is skipped.
+    """
+    def __init__(self, backend: FakeBackend, **kwargs):
+        super().__init__(auth="fake-token", **kwargs)
+        self.backend = backend
+
+    def _internal_call(self, method, url, payload, params):
+        if not url.startswith("http"):
+            url = self.prefix + url
+        status, headers, body = self.backend.handle(method, url, params=params, payload=payload)
+        if status >= 400:
+            raise SpotifyException(status, -1, f"{url}:\n {body['error']['message']}", headers=headers)
+        return body
+
+
+class FakeSpotifyServer:
+    """
+    Serves `backend` over HTTP on localhost. Point a client at `base_url`, e.g. `SpotifyUtil(api_base=server.base_url, ...)`.
+    """
+    def __init__(self, backend: FakeBackend, host="127.0.0.1", port=0):
+        self.backend = backend
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                url = f"http://{self.headers.get('Host')}{self.path}"
+                status, headers, response = backend.handle(self.command, url, payload=json.loads(body) if body else None)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class StaticToken:
+    """
+    An auth manager handing out a fixed token, for clients talking to a `FakeSpotifyServer`.
+    """
+    def get_access_token(self, *args, **kwargs):
+        return {"access_token": "fake-token"}
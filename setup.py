@@ -26,5 +26,6 @@ setuptools.setup(
     ],
     python_requires=">= 3.8",
     include_package_data=True,
-    install_requires=["spotipy"]
+    install_requires=["spotipy"],
+    extras_require={"async": ["aiohttp"]}
 )
\ No newline at end of file
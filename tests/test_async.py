@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from SpotifyUtil import AsyncSpotifyUtil
+from SpotifyUtil.scheduler import RequestScheduler
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotifyServer, StaticToken
+
+
+logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+
+def playlist_url(playlist_id):
+    return f"https://open.spotify.com/playlist/{playlist_id}"
+
+
+def uris(ids):
+    return [f"spotify:track:{track_id}" for track_id in ids]
+
+
+def run(backend, flow, **kwargs):
+    """
+    Runs `flow(sp)` with an `AsyncSpotifyUtil` talking to a `FakeSpotifyServer` over `backend`.
+    """
+    async def main(base_url):
+        async with AsyncSpotifyUtil(auth_manager=StaticToken(), api_base=base_url, **kwargs) as sp:
+            return await flow(sp), sp.get_stats()
+    with FakeSpotifyServer(backend) as server:
+        return asyncio.run(main(server.base_url))
+
+
+def created(backend):
+    return {playlist["name"]: playlist["items"] for playlist_id, playlist in backend.library.playlists.items() if playlist_id.startswith("created")}
+
+
+def test_reads():
+    backend = FakeBackend(SyntheticLibrary(250))
+    library = backend.library
+
+    async def flow(sp):
+        return await asyncio.gather(
+            sp.get_tracks(playlist_url("source")),
+            sp.get_tracks(playlist_url("source"), avoid_unavailable=True),
+            sp.get_tracks(playlist_url("source"), verbose=True),
+            sp.get_tracks("https://open.spotify.com/album/album", type="album"),
+            sp.get_liked_songs(limit=50, offset=0),
+            sp.get_playlist_name_from_id("target"),
+        )
+    (tracks, playable, details, album, liked, name), _ = run(backend, flow)
+
+    assert tracks == uris(library.playlists["source"]["items"])
+    assert len(playable) == 225
+    assert details.total_size == 250 and details.playable_size == 225
+    assert album == uris(library.albums["album"])
+    assert [item["track"]["id"] for item in liked] == library.liked
+    assert name == "target"
+
+
+def test_writes():
+    backend = FakeBackend(SyntheticLibrary(250))
+    library = backend.library
+    source = list(library.playlists["source"]["items"])
+    target = list(library.playlists["target"]["items"])
+
+    async def flow(sp):
+        await sp.add_songs_to_playlist(playlist_url=playlist_url("target"), from_url=playlist_url("source"))
+        await sp.add_songs_to_playlist(from_url=playlist_url("source"), name="Copy", skip_unplayables=True)
+        await sp.add_liked_songs_to_playlist(name="Liked", limit=50)
+        await sp.delete_tracks(playlist_url("source"), uris(library.playlists["source"]["items"][:120]))
+    run(backend, flow)
+
+    assert library.playlists["target"]["items"] == target + [track_id for track_id in source if track_id not in target]
+    assert len(created(backend)["Copy"]) == 225
+    assert created(backend)["Liked"] == library.liked
+    assert len(library.playlists["source"]["items"]) == 130
+
+
+def test_add_from_file_and_clear(tmp_path):
+    backend = FakeBackend(SyntheticLibrary(50))
+    songs = tmp_path / "songs.txt"
+    songs.write_text("Song 3 - Artist 3\nSong 5 - Artist 5\nNothing like it\n")
+
+    async def flow(sp):
+        report = await sp.add_songs_to_playlist_from_file(str(songs), name="From file")
+        await sp.clear_playlist(playlist_url("target"))
+        return report
+    report, stats = run(backend, flow)
+
+    assert list(report.failed) == ["Nothing like it"]
+    assert created(backend)["From file"] == [SyntheticLibrary.track_id(3), SyntheticLibrary.track_id(5)]
+    assert backend.library.playlists["target"]["items"] == []
+    for name in ("add_songs_to_playlist_from_file", "clear_playlist", "create_playlist"):
+        assert stats["operations"][name]["errors"] == 0
+
+
+def test_rate_limited_requests_are_retried():
+    backend = FakeBackend(SyntheticLibrary(500), throttle_every=4)
+
+    async def flow(sp):
+        return await sp.get_tracks(playlist_url("source"))
+    tracks, stats = run(backend, flow, scheduler=RequestScheduler(backoff_base=0.01))
+
+    assert tracks == uris(backend.library.playlists["source"]["items"])
+    assert sum(endpoint["retries"] for endpoint in stats["api"].values()) > 0
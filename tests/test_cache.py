@@ -0,0 +1,71 @@
+import gc
+import logging
+import tracemalloc
+from itertools import product
+from string import ascii_uppercase
+from SpotifyUtil import SpotifyUtil
+from SpotifyUtil.cache import TrackCache
+from SpotifyUtil.records import TrackRecord
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotify
+
+
+logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+
+def test_tracks_are_cached_as_records(tmp_path):
+    backend = FakeBackend(SyntheticLibrary(120))
+    ids = [SyntheticLibrary.track_id(idx) for idx in range(120)]
+    path = str(tmp_path / "tracks.db")
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False, track_cache=TrackCache(path=path))
+    records = sp.get_tracks_details(ids)
+    assert backend.calls["GET tracks"] == 3
+
+    # A new client reads them back from the SQLite tier, without fetching them again.
+    backend.reset_calls()
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False, track_cache=TrackCache(path=path))
+    cached = sp.get_tracks_details(ids)
+    assert backend.calls["GET tracks"] == 0
+    assert all(isinstance(record, TrackRecord) for record in cached) and cached == records
+    assert sp.check_track_is_playable(ids[9]) is False
+    # The full JSON is still there on demand.
+    assert cached[0].track["popularity"] == 0
+
+
+def retained(track_cache, markets, size=3000):
+    backend = FakeBackend(SyntheticLibrary(size, markets=markets))
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False, track_cache=track_cache)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = sp.get_tracks("https://open.spotify.com/playlist/source", verbose=True)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert len(result) == 3000
+    return size
+
+
+def test_cached_tracks_cost_little_memory():
+    markets = ["".join(code) for code in product(ascii_uppercase, repeat=2)][:180]
+    # The cache shares the records of the result instead of holding every track's JSON and market list.
+    assert retained(None, markets) < 1.5 * retained(TrackCache(max_size=0), markets)
+
+
+def test_own_adds_patch_the_cached_playlist_only_if_it_was_current():
+    backend = FakeBackend(SyntheticLibrary(60))
+    target = "https://open.spotify.com/playlist/target"
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False)
+    other = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False)
+    sp.get_tracks(target)
+
+    # Back to back, the add patches the cache and the playlist isn't read again.
+    sp.add_tracks_in_chunks([f"spotify:track:{SyntheticLibrary.track_id(0)}"], "target")
+    backend.reset_calls()
+    assert len(sp.get_tracks(target)) == 31
+    assert backend.calls["GET playlists/{id}/items"] == 0
+
+    # Someone else's add in between leaves the cache behind, so it's dropped instead of patched.
+    other.add_tracks_in_chunks([f"spotify:track:{SyntheticLibrary.track_id(2)}"], "target")
+    sp.add_tracks_in_chunks([f"spotify:track:{SyntheticLibrary.track_id(4)}"], "target")
+    assert sp.get_tracks(target) == [f"spotify:track:{track_id}" for track_id in backend.library.playlists["target"]["items"]]
+    assert len(backend.library.playlists["target"]["items"]) == 33
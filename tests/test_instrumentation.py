@@ -0,0 +1,86 @@
+import json
+import logging
+from SpotifyUtil import SpotifyUtil
+from SpotifyUtil.instrumentation import JsonLinesSink
+from SpotifyUtil.jobs import JobRunner
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotify, FakeSpotifyServer, StaticToken
+
+
+logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+
+def playlist_url(playlist_id):
+    return f"https://open.spotify.com/playlist/{playlist_id}"
+
+
+def make_client(size=120):
+    backend = FakeBackend(SyntheticLibrary(size))
+    return SpotifyUtil(client=FakeSpotify(backend)), backend
+
+
+def created(backend):
+    return {playlist["name"]: playlist["items"] for playlist_id, playlist in backend.library.playlists.items() if playlist_id.startswith("created")}
+
+
+def test_methods_taking_name_are_recorded(tmp_path):
+    sp, backend = make_client()
+    songs = tmp_path / "songs.txt"
+    songs.write_text("Song 3 - Artist 3\nSong 5 - Artist 5\n")
+
+    sp.create_playlist(name="Empty")
+    sp.add_liked_songs_to_playlist(name="Liked", limit=10)
+    sp.create_unplayable_track_playlist(name="Unplayable", playlist_url=playlist_url("source"))
+    sp.add_songs_to_playlist_from_file(str(songs), name="From file")
+    sp.add_songs_to_playlist(from_url=playlist_url("target"), name="Copy")
+
+    playlists = created(backend)
+    assert playlists["Empty"] == []
+    # `limit` is the page size, every page of liked songs is added.
+    assert playlists["Liked"] == backend.library.liked
+    assert len(playlists["Unplayable"]) == 12
+    assert playlists["From file"] == [SyntheticLibrary.track_id(3), SyntheticLibrary.track_id(5)]
+    assert playlists["Copy"] == backend.library.playlists["target"]["items"]
+    operations = sp.get_stats()["operations"]
+    for name in ("create_playlist", "add_liked_songs_to_playlist", "create_unplayable_track_playlist", "add_songs_to_playlist_from_file", "add_songs_to_playlist"):
+        assert operations[name]["errors"] == 0
+    assert sp.get_stats()["api"]["user_playlist_create"]["count"] == 5
+
+
+def test_per_track_helpers_are_not_recorded():
+    sp, backend = make_client()
+    sp.delete_tracks(playlist_url("target"), backend.library.playlists["target"]["items"][:10])
+    sp.check_track_is_playable(backend.library.playlists["target"]["items"][0])
+    sp.get_track_details(backend.library.playlists["target"]["items"][1])
+    operations = sp.get_stats()["operations"]
+    assert not {"create_uri", "check_track_is_playable", "get_track_details"} & set(operations)
+    assert sp.get_stats()["operations"]["delete_tracks"]["count"] == 1
+    assert len(backend.library.playlists["target"]["items"]) == 50
+
+
+def test_job_runner_operations_taking_name(tmp_path):
+    songs = tmp_path / "songs.txt"
+    songs.write_text("Song 7 - Artist 7\n")
+    backend = FakeBackend(SyntheticLibrary(60))
+    with FakeSpotifyServer(backend) as server:
+        config = {"auth_manager": StaticToken(), "api_base": server.base_url}
+        results = JobRunner({"users": {"alice": config}, "jobs": [
+            {"user": "alice", "op": "add_liked", "args": {"name": "Liked", "limit": 5}},
+            {"user": "alice", "op": "unplayable", "args": {"name": "Unplayable", "playlist_url": playlist_url("source")}},
+            {"user": "alice", "op": "add_from_file", "args": {"file_path": str(songs), "name": "From file"}},
+        ]}, processes=1, rate=None).run()
+    assert [result.error for result in results] == [None, None, None]
+    assert all(result.ok for result in results)
+    assert created(backend)["From file"] == [SyntheticLibrary.track_id(7)]
+
+
+def test_json_lines_sink_keeps_the_file_open(tmp_path, monkeypatch):
+    path = tmp_path / "calls.jsonl"
+    sink = JsonLinesSink(str(path), flush_interval=60)
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *args, **kwargs: opened.append(args) or real_open(*args, **kwargs))
+    for idx in range(100):
+        sink.emit({"type": "api", "name": "tracks", "idx": idx})
+    assert len(opened) == 1
+    sink.close()
+    assert [json.loads(line)["idx"] for line in path.read_text().splitlines()] == list(range(100))
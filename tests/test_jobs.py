@@ -0,0 +1,26 @@
+from SpotifyUtil import jobs
+from SpotifyUtil.scheduler import RequestScheduler, SharedTokenBucket
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotify
+
+
+def run_in_worker(monkeypatch, bucket):
+    # Runs a job the way a worker process would, keeping the scheduler it was given.
+    schedulers = []
+
+    class Recorded(RequestScheduler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            schedulers.append(self)
+
+    monkeypatch.setattr(jobs, "RequestScheduler", Recorded)
+    jobs._init_worker(bucket, 4)
+    config = {"client": FakeSpotify(FakeBackend(SyntheticLibrary(20))), "instrumentation": False}
+    (_, result), = jobs._run_user_jobs("alice", config, [(0, {"op": "clear", "args": {"playlist_url": "https://open.spotify.com/playlist/target"}})])
+    assert result.ok
+    return schedulers[0]
+
+
+def test_workers_share_the_bucket_or_have_no_limit(monkeypatch):
+    bucket = SharedTokenBucket(5.0)
+    assert run_in_worker(monkeypatch, bucket).bucket is bucket
+    assert run_in_worker(monkeypatch, None).bucket is None
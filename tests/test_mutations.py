@@ -0,0 +1,114 @@
+import json
+import logging
+import threading
+import time
+from SpotifyUtil import SpotifyUtil
+from SpotifyUtil.mutations import MutationQueue
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotify
+
+
+logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+
+def test_streamed_adds_go_out_while_pages_are_fetched():
+    backend = FakeBackend(SyntheticLibrary(1000))
+    methods = []
+    handle = backend.handle
+
+    def slow_handle(method, url, **kwargs):
+        # Pages take a while, as they would over the network.
+        if method == "GET": time.sleep(0.02)
+        methods.append(method)
+        return handle(method, url, **kwargs)
+
+    backend.handle = slow_handle
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False)
+    methods.clear()
+
+    sp.add_tracks_in_chunks(sp.iter_tracks("https://open.spotify.com/playlist/source"), "target")
+
+    # Batches go out while the next pages are fetched, instead of after every page.
+    assert methods.count("GET") == methods.count("POST") == 10
+    assert methods.index("POST") < 3
+    assert backend.library.playlists["target"]["items"][500:] == backend.library.playlists["source"]["items"]
+
+
+def interrupted_import(backend, journal, allow_duplicates):
+    # Imports the source into an empty playlist, losing the connection on the 4th batch.
+    backend.library.add_playlist("empty", [])
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False, mutation_journal_path=journal)
+    send_add, sent = sp.mutations.send_add, []
+
+    def failing_add(playlist_id, uris):
+        sent.append(uris)
+        if len(sent) == 4:
+            raise RuntimeError("Connection lost")
+        return send_add(playlist_id, uris)
+
+    sp.mutations.send_add = failing_add
+    try:
+        sp.add_songs_to_playlist(playlist_url="https://open.spotify.com/playlist/empty", from_url="https://open.spotify.com/playlist/source", allow_duplicates=allow_duplicates)
+    except RuntimeError:
+        pass
+    assert len(backend.library.playlists["empty"]["items"]) == 300
+
+
+def test_interrupted_import_resumes_without_duplicates(tmp_path):
+    for allow_duplicates in (False, True):
+        backend = FakeBackend(SyntheticLibrary(1000))
+        journal = str(tmp_path / "journal.json")
+        interrupted_import(backend, journal, allow_duplicates)
+
+        sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False, mutation_journal_path=journal)
+        sp.add_songs_to_playlist(playlist_url="https://open.spotify.com/playlist/empty", from_url="https://open.spotify.com/playlist/source", allow_duplicates=allow_duplicates)
+        assert backend.library.playlists["empty"]["items"] == backend.library.playlists["source"]["items"]
+        assert not (tmp_path / "journal.json").exists()
+
+
+def test_adds_after_a_resumed_import_go_out(tmp_path):
+    backend = FakeBackend(SyntheticLibrary(1000))
+    journal = str(tmp_path / "journal.json")
+    uri = f"spotify:track:{SyntheticLibrary.track_id(0)}"
+    interrupted_import(backend, journal, allow_duplicates=True)
+
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False, mutation_journal_path=journal)
+    sp.add_songs_to_playlist(playlist_url="https://open.spotify.com/playlist/empty", from_url="https://open.spotify.com/playlist/source", allow_duplicates=True)
+    sp.add_tracks_in_chunks([uri], "empty")
+    assert len(backend.library.playlists["empty"]["items"]) == 1001
+
+    # Applying only what an interrupted import left doesn't hold back later adds either.
+    interrupted_import(backend, journal, allow_duplicates=True)
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False, mutation_journal_path=journal)
+    sp.flush_mutations()
+    sp.add_tracks_in_chunks([uri], "empty")
+    assert backend.library.playlists["empty"]["items"][-1] == SyntheticLibrary.track_id(0)
+    assert not (tmp_path / "journal.json").exists()
+
+
+def test_concurrent_flushes_keep_the_journal(tmp_path):
+    journal = tmp_path / "journal.json"
+    sending, release = threading.Event(), threading.Event()
+
+    def send_add(playlist_id, uris):
+        if playlist_id == "slow":
+            sending.set()
+            release.wait(5)
+        return "snapshot"
+
+    queue = MutationQueue(send_add, lambda playlist_id, uris: "snapshot", journal_path=str(journal))
+    queue.add("slow", ["spotify:track:a"])
+    slow = threading.Thread(target=queue.flush, args=("slow",))
+    slow.start()
+    sending.wait(5)
+    queue.add("fast", ["spotify:track:b"])
+    fast = threading.Thread(target=queue.flush, args=("fast",))
+    fast.start()
+    fast.join(0.2)
+
+    # The batch in flight is still journaled, so a crash now would resume it.
+    assert json.loads(journal.read_text().splitlines()[0]) == {"playlist": "slow", "add": [["spotify:track:a"]], "remove": []}
+    release.set()
+    slow.join(5)
+    fast.join(5)
+    assert queue.pending() == {}
+    assert not journal.exists()
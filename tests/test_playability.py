@@ -0,0 +1,42 @@
+import logging
+import time
+from SpotifyUtil import SpotifyUtil
+from SpotifyUtil.cache import PlaylistCache
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotify
+
+
+logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+SOURCE = "https://open.spotify.com/playlist/source"
+
+
+def test_refreshed_markets_reach_the_index_and_the_cached_playlists():
+    backend = FakeBackend(SyntheticLibrary(50))
+    library = backend.library
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False)
+    uri = f"spotify:track:{library.track_id(0)}"
+    assert sp.get_unplayable_songs_from_playlist(SOURCE) == [f"spotify:track:{library.track_id(idx)}" for idx in range(9, 50, 10)]
+    assert sp.get_playable_songs_length(SOURCE) == 45
+
+    # The track is taken down, which doesn't change the snapshot of the playlists holding it.
+    track = library.track(library.track_id(0))
+    track["available_markets"] = []
+    library.tracks[library.track_id(0)] = track
+    sp.refresh_track_markets([uri])
+
+    assert sp.check_track_is_playable(uri) is False
+    assert sp.get_unplayable_songs_from_playlist(SOURCE)[0] == uri
+    assert sp.get_playable_songs_length(SOURCE) == 44
+    assert sp.get_tracks(SOURCE, verbose=True).playable_size == 44
+
+
+def test_cached_playlists_expire():
+    backend = FakeBackend(SyntheticLibrary(50))
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False, playlist_cache=PlaylistCache(ttl=0.05))
+    sp.get_tracks(SOURCE)
+    backend.reset_calls()
+    sp.get_tracks(SOURCE)
+    assert backend.calls["GET playlists/{id}/items"] == 0
+    time.sleep(0.1)
+    sp.get_tracks(SOURCE)
+    assert backend.calls["GET playlists/{id}/items"] == 1
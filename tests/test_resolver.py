@@ -0,0 +1,34 @@
+import asyncio
+import logging
+from SpotifyUtil import SpotifyUtil, AsyncSpotifyUtil
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotifyServer, StaticToken
+
+
+logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+LINES = ["Song 3 - Artist 3", "  song 3  -  artist 3 ", "Song 5 - Somebody Else", "Nothing like it", "", "Song 8 - Artist 8"]
+
+
+def resolve_async(base_url, lines):
+    async def run():
+        async with AsyncSpotifyUtil(auth_manager=StaticToken(), api_base=base_url) as sp:
+            return await sp.resolve_track_names(lines), await sp.get_track_IDs_from_names(lines)
+    return asyncio.run(run())
+
+
+def test_both_clients_resolve_lines_alike():
+    backend = FakeBackend(SyntheticLibrary(50))
+    with FakeSpotifyServer(backend) as server:
+        sp = SpotifyUtil(auth_manager=StaticToken(), api_base=server.base_url)
+        report, ids = sp.resolve_track_names(LINES), sp.get_track_IDs_from_names(LINES)
+        backend.reset_calls()
+        async_report, async_ids = resolve_async(server.base_url, LINES)
+        searches = backend.calls["GET search"]
+
+    for result in (report, async_report):
+        assert result.resolved == {"Song 3 - Artist 3": SyntheticLibrary.track_id(3), "song 3 - artist 3": SyntheticLibrary.track_id(3), "Song 8 - Artist 8": SyntheticLibrary.track_id(8)}
+        assert list(result.ambiguous) == ["Song 5 - Somebody Else"]
+        assert list(result.failed) == ["Nothing like it"]
+    assert async_ids == ids == [SyntheticLibrary.track_id(idx) for idx in (3, 3, 5, 8)]
+    # The four distinct lines are searched once, found ones are cached for the second call, the one without results isn't.
+    assert searches == 5
@@ -0,0 +1,39 @@
+import threading
+import time
+from email.utils import formatdate
+from SpotifyUtil.scheduler import RequestScheduler
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        self.http_status = 429
+        self.headers = {"Retry-After": retry_after}
+
+
+def test_a_429_pauses_every_call():
+    scheduler = RequestScheduler(rate=None, backoff_base=0.01)
+    throttled, sent = threading.Event(), []
+
+    def throttled_once():
+        if not throttled.is_set():
+            throttled.set()
+            raise RateLimited("0.3")
+        return "done"
+
+    first = threading.Thread(target=scheduler.call, args=(throttled_once,))
+    first.start()
+    throttled.wait(5)
+    start = time.monotonic()
+    scheduler.call(lambda: sent.append(time.monotonic() - start))
+    first.join(5)
+
+    # The other call waited out the Retry-After instead of going out right away.
+    assert sent[0] >= 0.25
+    assert scheduler.get_stats()["pause_wait"] > 0
+
+
+def test_retry_after_dates_and_garbage():
+    scheduler = RequestScheduler(rate=None, backoff_base=0.01, backoff_cap=0.05)
+    delay = scheduler._retry_delay(RateLimited(formatdate(time.time() + 2, usegmt=True)), attempt=0)
+    assert 0.5 < delay <= 2.1
+    assert scheduler._retry_delay(RateLimited("soon"), attempt=0) <= 0.05
@@ -0,0 +1,84 @@
+import logging
+import random
+from SpotifyUtil import SpotifyUtil
+from SpotifyUtil.sync import plan_sync
+from benchmarks.fake_spotify import SyntheticLibrary, FakeBackend, FakeSpotify
+
+
+logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+SOURCE = [f"spotify:track:{idx}" for idx in range(1000)]
+
+
+def apply(items, ops):
+    items = list(items)
+    for op in ops:
+        if op["op"] == "remove":
+            for position in sorted((position for item in op["items"] for position in item["positions"]), reverse=True):
+                del items[position]
+        elif op["op"] == "move":
+            start, length, before = op["range_start"], op["range_length"], op["insert_before"]
+            block, rest = items[start:start + length], items[:start] + items[start + length:]
+            before = before if before <= start else before - length
+            items = rest[:before] + block + rest[before:]
+        elif op["op"] == "add":
+            items[op["position"]:op["position"]] = op["uris"]
+        else:
+            items = list(op["uris"])
+    return items
+
+
+def test_scripts_produce_the_desired_playlist():
+    rng = random.Random(0)
+    for _ in range(2000):
+        pool = [f"spotify:track:{idx}" for idx in range(rng.randrange(1, 60))]
+        current = [rng.choice(pool) for _ in range(rng.randrange(50))]
+        if rng.random() < 0.3:
+            current.insert(rng.randrange(len(current) + 1), None)
+        desired = [rng.choice(pool) for _ in range(rng.randrange(50))]
+        ops = plan_sync(current, desired, batch_size=rng.choice([1, 3, 100]))
+        assert apply(current, ops) == desired + [uri for uri in current if uri is None]
+
+
+def test_large_reorders_cost_no_more_than_a_replace():
+    shuffled = list(SOURCE)
+    random.Random(1).shuffle(shuffled)
+    spread = [uri for idx, uri in enumerate(SOURCE) if idx % 7]
+    for current in (shuffled, SOURCE[::-1], spread):
+        ops = plan_sync(current, SOURCE)
+        assert len(ops) == 10
+        assert apply(current, ops) == SOURCE
+
+
+def test_small_reorders_only_move_what_moved():
+    current = list(SOURCE)
+    current.insert(10, current.pop(900))
+    current.insert(500, current.pop(20))
+    ops = plan_sync(current, SOURCE)
+    assert [op["op"] for op in ops] == ["move", "move"]
+    assert apply(current, ops) == SOURCE
+
+
+def test_unavailable_entries_are_never_replaced():
+    shuffled = list(SOURCE)
+    random.Random(3).shuffle(shuffled)
+    for current in (SOURCE[::-1] + [None], shuffled[:500] + ["spotify:local:a:b:c:1"] + shuffled[500:]):
+        ops = plan_sync(current, SOURCE)
+        assert "replace" not in {op["op"] for op in ops}
+        # Every track removed and added back, 100 at a time, instead of a move per track.
+        assert len(ops) == 20
+        assert apply(current, ops) == SOURCE + [uri for uri in current if uri is None or uri.startswith("spotify:local:")]
+
+
+def test_sync_playlist_against_the_fake_backend():
+    backend = FakeBackend(SyntheticLibrary(1000))
+    target = backend.library.playlists["target"]["items"]
+    random.Random(2).shuffle(target)
+    sp = SpotifyUtil(client=FakeSpotify(backend), instrumentation=False)
+    backend.reset_calls()
+
+    counts = sp.sync_playlist("https://open.spotify.com/playlist/source", "https://open.spotify.com/playlist/target")
+
+    assert backend.library.playlists["target"]["items"] == backend.library.playlists["source"]["items"]
+    assert counts == {"remove": 0, "move": 0, "add": 9, "replace": 1}
+    assert backend.total_calls() < 30